@@ -0,0 +1,126 @@
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from db import (
+    get_cached_classifications,
+    save_classifications,
+    purge_expired_classifications,
+)
+from reddit_data_extractor import item_id, content_hash
+
+load_dotenv()
+
+# How long a verdict stays valid, in hours
+CACHE_TTL = timedelta(hours=float(os.getenv("CLASSIFICATION_CACHE_TTL_HOURS", "168")))
+# Number of verdicts kept in the in-process LRU layer
+CACHE_SIZE = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "50000"))
+
+
+class LRUCache:
+    """
+    Small in-process LRU cache whose entries expire a TTL after they were created
+
+    Entries carry the UTC creation time of the stored verdict, so one loaded
+    from Postgres expires when its row does, not a full TTL after loading.
+    """
+
+    def __init__(self, max_size: int, ttl: timedelta):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if datetime.utcnow() - created_at >= self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, created_at: datetime):
+        self.entries[key] = (created_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def purge(self):
+        """Drop every expired entry"""
+        cutoff = datetime.utcnow() - self.ttl
+        expired = [
+            key for key, (created_at, _) in self.entries.items() if created_at <= cutoff
+        ]
+        for key in expired:
+            del self.entries[key]
+
+
+# Hot layer in front of the classification_cache table
+_hot_cache = LRUCache(CACHE_SIZE, CACHE_TTL)
+
+
+def cache_key(item: dict, user_query: str, model: str) -> str:
+    """
+    Build the cache key of an item's verdict
+
+    Args:
+        item (dict): Post or comment dict from the extractor
+        user_query (str): The user's service description
+        model (str): Model that produced the verdict
+
+    Returns:
+        str: sha256 of (item id, content hash, user_query hash, model)
+    """
+    query_hash = hashlib.sha256(user_query.encode("utf-8")).hexdigest()
+    raw = "|".join((item_id(item), content_hash(item), query_hash, model))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def lookup(keys: list):
+    """
+    Look up verdicts in the LRU layer first, then in Postgres
+
+    Args:
+        keys (list): Cache keys to look up
+
+    Returns:
+        dict: Cache key -> (is_lead, description) for every hit
+    """
+    hits = {}
+    missing = []
+    for key in keys:
+        verdict = _hot_cache.get(key)
+        if verdict is None:
+            missing.append(key)
+        else:
+            hits[key] = verdict
+
+    stored = await get_cached_classifications(missing, CACHE_TTL)
+    for key, (is_lead, description, created_at) in stored.items():
+        _hot_cache.set(key, (is_lead, description), created_at)
+        hits[key] = (is_lead, description)
+    return hits
+
+
+async def store(entries: list):
+    """
+    Store fresh verdicts in both cache layers
+
+    Args:
+        entries (list): Dicts with cache_key, item_id, model, is_lead and description
+    """
+    now = datetime.utcnow()
+    for entry in entries:
+        _hot_cache.set(
+            entry["cache_key"], (entry["is_lead"], entry["description"]), now
+        )
+    await save_classifications(entries)
+
+
+async def purge_expired():
+    """Drop verdicts older than CACHE_TTL from both cache layers"""
+    _hot_cache.purge()
+    await purge_expired_classifications(CACHE_TTL)
@@ -1,29 +1,55 @@
 import asyncio
-from reddit_data_extractor import get_reddit_data
+from datetime import datetime
+from reddit_data_extractor import stream_reddit_data, advance_cursors, item_id
 from leadFinderAi import find_leads
-from url_mapper import process_ai_output
-from db import save_leads, get_scanned_subreddits, save_scanned_subreddit
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from prefilter import prefilter_items
+from semantic_ranker import rank_items
+from dedup import collapse_duplicates, fan_out, fan_out_leads
+from seen_index import seen_index, rebuild_seen_index, SEEN_INDEX_ENABLED
+from url_mapper import (
+    process_ai_output,
+    build_source_index,
+    join_sources,
+    drop_unknown_leads,
+)
+from db import (
+    insert_leads,
+    get_scanned_subreddits,
+    save_scanned_subreddit,
+    get_subreddit_cursors,
+    save_subreddit_cursors,
+    save_seen_items,
+    purge_expired_seen_items,
+    get_keywords,
+    save_lead_profiles,
+    save_scan,
+    init_db,
+    close_db,
+)
+from classification_cache import CACHE_TTL, purge_expired
 import os
-import re
 from dotenv import load_dotenv
 from job_tracker import JobStatus
 from job_tracker import get_job, JobStatus
 
 load_dotenv()
 
+# Posts plus comments sent to the AI per batch
+BATCH_SIZE = int(os.getenv("LEAD_BATCH_SIZE", "50"))
+# Maximum number of batches being classified and saved at the same time
+CLASSIFY_CONCURRENCY = int(os.getenv("LEAD_CLASSIFY_CONCURRENCY", "3"))
 
-class LeadlyController:
-    def __init__(self):
-        self.engine = create_async_engine(
-            re.sub(
-                r"^postgresql:", "postgresql+asyncpg:", os.getenv("DATABASE_URL") or ""
-            ),
-            echo=True,
-        )
-        self.SessionLocal = async_sessionmaker(bind=self.engine)
 
-    async def run_lead_finder(self, user_query: str, subreddits=None, job_id=None):
+class LeadlyController:
+    async def run_lead_finder(
+        self,
+        user_query: str,
+        subreddits=None,
+        job_id=None,
+        incremental=False,
+        keywords=None,
+        new_only=False,
+    ):
         """
         Central controller method that orchestrates the entire lead finding process
 
@@ -31,58 +57,171 @@ class LeadlyController:
             user_query (str): The user's service description
             subreddits (list): List of subreddit names to scan
             job_id (str): Optional job ID for tracking progress
+            incremental (bool): Only fetch content newer than each subreddit's
+                stored cursor, and advance the cursors once leads are saved
+            keywords (list): Extra prefilter keywords on top of the configured ones
+            new_only (bool): Only return leads that were not in the database yet
 
         Returns:
             dict: URL to description mapping of leads
         """
+        results = await self.run_profiles(
+            {None: user_query}, subreddits, job_id, incremental, keywords, new_only
+        )
+        return results.get(None, {})
+
+    async def run_profiles(
+        self,
+        profiles: dict,
+        subreddits=None,
+        job_id=None,
+        incremental=False,
+        keywords=None,
+        new_only=False,
+    ):
+        """
+        Find leads for several service profiles from a single Reddit extraction
+
+        Extraction, AI classification and saving run as a streaming pipeline:
+        every batch yielded by the extractor is classified for each profile
+        and stored while the remaining subreddits are still being fetched.
+        Reddit is read once no matter how many profiles there are.
+
+        Args:
+            profiles (dict): Profile name -> service description; leads of a
+                named profile are also tagged with that name, a None name
+                stores untagged leads
+            subreddits (list): List of subreddit names to scan
+            job_id (str): Optional job ID for tracking progress
+            incremental (bool): Only fetch content newer than each subreddit's
+                stored cursor, and advance the cursors once leads are saved;
+                items in the seen index are skipped and new ones added to it
+            keywords (list): Extra prefilter keywords on top of the configured ones
+            new_only (bool): Only return leads this run inserted into the
+                database, as reported by INSERT ... ON CONFLICT DO NOTHING RETURNING
+
+        Returns:
+            dict: Profile name -> URL to description mapping of leads
+        """
         # Get job tracker if job_id is provided
         job = get_job(job_id) if job_id else None
 
+        tasks = []
+        batches = []
+        started_at = datetime.utcnow()
+        items_extracted = 0
         try:
             if job:
                 job.update_status(JobStatus.PROCESSING)
                 job.update_progress(10)
 
-            print("Starting lead finding process...")
+            print(f"Starting lead finding process for {len(profiles)} profile(s)...")
 
-            # Step 1: Extract data from Reddit
+            cursors = (
+                await get_subreddit_cursors(subreddits)
+                if incremental and subreddits
+                else None
+            )
+            new_cursors = {}
+            # Processed ids only say "seen" for the scheduled query, so manual
+            # searches with other descriptions still read everything
+            seen = seen_index if incremental and SEEN_INDEX_ENABLED else None
+            extracted_ids = []
+            keywords = list(dict.fromkeys([*(keywords or []), *await get_keywords()]))
+
+            # Step 1: Extract data from Reddit, batch by batch
             print("Extracting data from Reddit...")
             if job:
                 job.update_progress(20)
 
-            posts_dict, posts_comments = await get_reddit_data(subreddits)
-            print(
-                f"Extracted {len(posts_dict)} posts and {len(posts_comments)} comments"
-            )
-
-            if job:
-                job.update_results(
-                    posts_processed=len(posts_dict),
-                    comments_processed=len(posts_comments),
+            # Bounds the number of batches held in memory or waiting on the AI
+            semaphore = asyncio.Semaphore(CLASSIFY_CONCURRENCY)
+
+            async for posts, comments in stream_reddit_data(
+                subreddits, batch_size=BATCH_SIZE, cursors=cursors, seen=seen
+            ):
+                print(f"Received batch of {len(posts)} posts and {len(comments)} comments")
+                items_extracted += len(posts) + len(comments)
+                if job:
+                    job.update_results(
+                        posts_processed=len(posts),
+                        comments_processed=len(comments),
+                    )
+                if seen is not None:
+                    extracted_ids.extend(item_id(item) for item in posts + comments)
+                if incremental:
+                    new_cursors.update(
+                        advance_cursors(
+                            {**(cursors or {}), **new_cursors}, posts, comments
+                        )
+                    )
+
+                # Steps 2-4 run in the background while extraction continues
+                await semaphore.acquire()
+                batches.append((posts, comments))
+                tasks.append(
+                    asyncio.create_task(
+                        self._process_batch(
+                            profiles, keywords, posts, comments, job, semaphore
+                        )
+                    )
                 )
-                job.update_progress(40)
-
-            # Step 2: Find leads using AI
-            print("Finding leads with AI...")
-            ai_output = find_leads(user_query, posts_dict, posts_comments)
-            print("AI analysis complete")
-
-            if job:
-                job.update_progress(60)
-
-            # Step 3: Process AI output to create URL-description mapping
-            print("Processing AI output...")
-            url_description_map = process_ai_output(ai_output)
-            print(f"Processed {len(url_description_map)} leads")
 
             if job:
-                job.update_results(leads_found=len(url_description_map))
-                job.update_progress(80)
-
-            # Step 4: Save leads to database
-            print("Saving leads to database...")
-            await save_leads(url_description_map)
-            print("Leads saved successfully")
+                job.update_progress(max(job.progress, 40))
+
+            # A failed batch costs only that batch, unless every batch failed
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            failures = [o for o in outcomes if isinstance(o, BaseException)]
+            if failures and len(failures) == len(outcomes):
+                raise failures[0]
+
+            results = {profile: {} for profile in profiles}
+            new_ids = set()
+            # Items of batches with failed AI calls are fetched and classified
+            # again next run: their subreddits keep the old cursor and they
+            # are not marked as seen
+            retry_ids = set()
+            retry_subreddits = set()
+            for (posts, comments), outcome in zip(batches, outcomes):
+                if isinstance(outcome, BaseException):
+                    print(
+                        f"Batch of {len(posts)} posts and {len(comments)} comments "
+                        f"failed: {outcome}"
+                    )
+                    if job:
+                        job.update_results(
+                            failed_ai_calls=getattr(outcome, "failed_calls", 0) or 1
+                        )
+                    failed_calls = 1
+                else:
+                    batch_results, batch_new_ids, failed_calls = outcome
+                    for profile, url_description_map in batch_results.items():
+                        results[profile].update(url_description_map)
+                    new_ids.update(batch_new_ids)
+                if failed_calls:
+                    retry_ids.update(item_id(item) for item in posts + comments)
+                    retry_subreddits.update(item["subreddit"] for item in posts + comments)
+            if new_only:
+                results = {
+                    profile: {
+                        url: description
+                        for url, description in url_description_map.items()
+                        if url.split("/")[-1] in new_ids
+                    }
+                    for profile, url_description_map in results.items()
+                }
+            for profile, url_description_map in results.items():
+                label = f" for profile {profile}" if profile else ""
+                print(f"Processed {len(url_description_map)} leads{label}")
+
+            # Mark the items as processed only once their batch succeeded
+            if seen is not None:
+                extracted_ids = [key for key in extracted_ids if key not in retry_ids]
+                # The table is what the filter is rebuilt from
+                await save_seen_items(extracted_ids)
+                await asyncio.to_thread(seen.add_many, extracted_ids)
+                await asyncio.to_thread(seen.flush)
 
             if job:
                 job.update_progress(90)
@@ -92,62 +231,226 @@ class LeadlyController:
                 for subreddit in subreddits:
                     await save_scanned_subreddit(subreddit)
 
+            # Step 6: Advance the high-water marks only after leads are stored,
+            # so a failed run is retried from the same point next time
+            if incremental:
+                await save_subreddit_cursors(
+                    {
+                        name: cursor
+                        for name, cursor in new_cursors.items()
+                        if name not in retry_subreddits
+                    }
+                )
+
+            # Step 7: Record the scan, the stats endpoint reads the last one
+            await save_scan(
+                started_at,
+                "completed",
+                subreddits=len(subreddits or []),
+                items_extracted=items_extracted,
+                leads_found=sum(len(leads) for leads in results.values()),
+            )
+
             if job:
                 job.update_status(JobStatus.COMPLETED)
                 job.update_progress(100)
 
-            return url_description_map
+            return results
 
         except Exception as e:
             print(f"Error in lead finder: {e}")
+            for task in tasks:
+                task.cancel()
             if job:
                 job.set_error(str(e))
+            await save_scan(
+                started_at,
+                "failed",
+                subreddits=len(subreddits or []),
+                items_extracted=items_extracted,
+            )
             return {}
 
-    async def scheduled_run(self, user_query: str):
+    async def _process_batch(
+        self, profiles, keywords, posts, comments, job, semaphore
+    ):
         """
-        Runs the lead finder with duplicate checking
-        """
-        # Get existing lead IDs from database to avoid duplicates
-        existing_lead_ids = await self.get_existing_lead_ids()
+        Classify one extracted batch for every profile and save its leads right away
 
-        # Get subreddits to scan (from DB or default)
-        subreddits = await get_scanned_subreddits()
-        if not subreddits:
-            subreddits = ["forhire", "slavelabour", "freelance"]
+        Args:
+            profiles (dict): Profile name -> service description
+            keywords (list): Prefilter keywords
+            posts (list): Posts of the batch
+            comments (list): Comments of the batch
+            job (SearchJob): Optional job to report progress on
+            semaphore (asyncio.Semaphore): Released once the batch is done
+
+        Returns:
+            tuple: (profile name -> URL to description mapping of the batch's
+            leads, set of the lead ids newly inserted into the database,
+            number of AI calls that failed)
+        """
+        try:
+            # Full metadata of every extracted item, used when saving leads
+            sources = build_source_index(posts, comments)
+            # Near-duplicates are classified once, for every profile
+            posts, comments, clusters = collapse_duplicates(posts, comments)
+            # A failing profile must not discard the others, which keep
+            # running and inserting leads until they finish
+            outcomes = await asyncio.gather(
+                *(
+                    self._classify_for_profile(
+                        profile,
+                        user_query,
+                        keywords,
+                        posts,
+                        comments,
+                        clusters,
+                        sources,
+                        job,
+                    )
+                    for profile, user_query in profiles.items()
+                ),
+                return_exceptions=True,
+            )
+            failures = [o for o in outcomes if isinstance(o, BaseException)]
+            if len(failures) == len(outcomes):
+                raise failures[0]
+            if job:
+                job.update_progress(min(80, job.progress + 5))
+
+            lead_maps = {}
+            new_ids = set()
+            failed_calls = 0
+            for profile, outcome in zip(profiles, outcomes):
+                if isinstance(outcome, BaseException):
+                    label = f" for profile {profile}" if profile else ""
+                    print(f"Classification{label} failed: {outcome}")
+                    calls = getattr(outcome, "failed_calls", 0) or 1
+                    if job:
+                        job.update_results(failed_ai_calls=calls)
+                    lead_maps[profile] = {}
+                    failed_calls += calls
+                    continue
+                lead_map, profile_new_ids, profile_failed_calls = outcome
+                lead_maps[profile] = lead_map
+                new_ids.update(profile_new_ids)
+                failed_calls += profile_failed_calls
+            return lead_maps, new_ids, failed_calls
+        finally:
+            semaphore.release()
+
+    async def _classify_for_profile(
+        self, profile, user_query, keywords, posts, comments, clusters, sources, job
+    ):
+        """
+        Classify a batch against one service description and save its leads
 
-        # Run the lead finder
-        url_description_map = await self.run_lead_finder(user_query, subreddits)
+        The verdict on each near-duplicate representative is fanned out to
+        every item of its cluster.
 
-        # Filter out existing leads
-        new_leads = {
-            url: desc
-            for url, desc in url_description_map.items()
-            if not any(lead_id in url for lead_id in existing_lead_ids)
+        Returns:
+            tuple: (URL to description mapping of the leads, set of the lead
+            ids newly inserted into the database, number of AI calls that failed)
+        """
+        # Step 2: Drop obvious noise locally, then find leads using AI
+        posts, comments = prefilter_items(user_query, posts, comments, keywords)
+        posts, comments = rank_items(user_query, posts, comments)
+        saved = {}
+        new_ids = set()
+
+        async def persist(key, lead):
+            # Store each lead the moment the AI stream completes it
+            members = {}
+            for member_key, member_lead in fan_out(key, lead, clusters):
+                members.setdefault(member_key, []).append(member_lead)
+            # Unknown ids are logged once, with the final mapping below
+            lead_map = drop_unknown_leads(process_ai_output(members), sources, log=False)
+            new_ids.update(await insert_leads(join_sources(lead_map, sources)))
+            if profile is not None:
+                await save_lead_profiles(profile, lead_map)
+            saved.update(lead_map)
+
+        ai_output = await find_leads(user_query, posts, comments, on_lead=persist)
+        ai_output = fan_out_leads(ai_output, clusters)
+
+        # Step 3: Process AI output to create URL-description mapping
+        url_description_map = drop_unknown_leads(process_ai_output(ai_output), sources)
+
+        # Step 4: Save whatever was not already stored while streaming
+        remaining = {
+            url: description
+            for url, description in url_description_map.items()
+            if url not in saved
         }
+        if remaining:
+            new_ids.update(await insert_leads(join_sources(remaining, sources)))
+            if profile is not None:
+                await save_lead_profiles(profile, remaining)
+        label = f" for profile {profile}" if profile else ""
+        print(f"Saved {len(url_description_map)} leads from batch{label}")
+
+        if job:
+            usage = ai_output.get("usage") or {}
+            job.update_results(
+                leads_found=len(url_description_map),
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                response_tokens=usage.get("response_tokens", 0),
+                failed_ai_calls=ai_output.get("failed_chunks", 0),
+            )
 
-        print(f"Found {len(new_leads)} new leads")
-        return new_leads
+        return url_description_map, new_ids, ai_output.get("failed_chunks", 0)
 
-    async def get_existing_lead_ids(self):
+    async def scheduled_run(self, user_query: str = None, profiles=None):
         """
-        Get all existing lead IDs from database
+        Runs the lead finder with duplicate checking
+
+        Args:
+            user_query (str): The user's service description
+            profiles (dict): Optional profile name -> service description,
+                classified together over a single extraction instead
+
+        Returns:
+            dict: URL to description mapping of new leads; with profiles the
+            description lists every matching profile as "[name] description",
+            joined with " | " when several profiles matched the same lead
         """
-        async with self.SessionLocal() as session:
-            from sqlalchemy import select
-            from models import Lead, Comment
+        # Drop AI verdicts that are too old to be reused
+        await purge_expired()
+        # Processed items become eligible again after the same TTL
+        await purge_expired_seen_items(CACHE_TTL)
+
+        # Periodically rebuild the seen index from the database, so it drops
+        # expired ids and is resized to the number of processed items
+        if SEEN_INDEX_ENABLED and await asyncio.to_thread(seen_index.needs_rebuild):
+            try:
+                await rebuild_seen_index()
+            except Exception as e:
+                print(f"Error rebuilding seen index: {e}")
 
-            # Get post IDs
-            stmt = select(Lead.post_id)
-            result = await session.execute(stmt)
-            lead_ids = [row[0] for row in result.fetchall()]
+        # Get subreddits to scan (from DB or default)
+        subreddits = await get_scanned_subreddits()
+        if not subreddits:
+            subreddits = ["forhire", "slavelabour", "freelance"]
 
-            # Get comment IDs
-            stmt = select(Comment.comment_id)
-            result = await session.execute(stmt)
-            comment_ids = [row[0] for row in result.fetchall()]
+        # Run the lead finder; leads already in the database are recognised by
+        # the bulk insert itself, so no id list is loaded up front
+        if profiles:
+            results = await self.run_profiles(
+                profiles, subreddits, incremental=True, new_only=True
+            )
+            labelled = {}
+            for profile, profile_map in results.items():
+                for url, desc in profile_map.items():
+                    labelled.setdefault(url, []).append(f"[{profile}] {desc}")
+            new_leads = {url: " | ".join(descs) for url, descs in labelled.items()}
+        else:
+            new_leads = await self.run_lead_finder(
+                user_query, subreddits, incremental=True, new_only=True
+            )
 
-            return lead_ids + comment_ids
+        print(f"Found {len(new_leads)} new leads")
+        return new_leads
 
 
 # For testing purposes
@@ -155,6 +458,13 @@ if __name__ == "__main__":
     controller = LeadlyController()
     user_query = "I am a freelance graphic designer and a full stack web developer looking for potential clients who need design or/and development services."
 
+    async def main():
+        await init_db()
+        try:
+            return await controller.run_lead_finder(user_query)
+        finally:
+            await close_db()
+
     # Run the controller
-    result = asyncio.run(controller.run_lead_finder(user_query))
+    result = asyncio.run(main())
     print("Final result:", result)
@@ -1,59 +1,274 @@
 import os
 import asyncio
+import base64
+import json
 import re
-from sqlalchemy import select
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, text, func, union_all, literal, null, tuple_
 from sqlalchemy.dialects.postgresql import insert
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from models import Base, Lead, SubredditToScan
+from url_mapper import join_sources
+from models import (
+    Base,
+    Lead,
+    Comment,
+    SubredditToScan,
+    SubredditCursor,
+    ClassificationCacheEntry,
+    Keyword,
+    LeadProfile,
+    LeadStat,
+    ScanHistory,
+    SeenItem,
+    SEARCH_CONFIG,
+    LEAD_SEARCH_VECTOR,
+    COMMENT_SEARCH_VECTOR,
+)
 
 load_dotenv()
 
+# Connections kept open in the pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+# Extra connections opened under load on top of DB_POOL_SIZE
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds after which a pooled connection is replaced
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Rows per bulk INSERT, keeps statements under the bind parameter limit
+INSERT_CHUNK_SIZE = int(os.getenv("DB_INSERT_CHUNK_SIZE", "1000"))
+# Set to "1" to log every SQL statement
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+# Idempotent DDL for columns added to tables that may already exist
+SCHEMA_UPGRADES = [
+    "ALTER TABLE leads ADD COLUMN IF NOT EXISTS description TEXT",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS description TEXT",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS subreddit_name VARCHAR(100)",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS post_id VARCHAR(20)",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS url VARCHAR(500)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_subreddit_name ON comments (subreddit_name)",
+    "ALTER TABLE leads ADD COLUMN IF NOT EXISTS score INTEGER",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS score INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_leads_created_at_id ON leads (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_subreddit_created_at_id "
+    "ON leads (subreddit_name, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_created_at_id ON comments (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_subreddit_created_at_id "
+    "ON comments (subreddit_name, created_at, id)",
+    "ALTER TABLE leads ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({LEAD_SEARCH_VECTOR}) STORED",
+    "ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({COMMENT_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_leads_search_vector "
+    "ON leads USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_search_vector "
+    "ON comments USING gin (search_vector)",
+    # Seed the counters from leads stored before lead_stats existed
+    "INSERT INTO lead_stats (subreddit_name, source, day, count) "
+    "SELECT subreddit_name, source, day, count(*) FROM ("
+    "SELECT subreddit_name, 'post' AS source, created_at::date AS day FROM leads "
+    "UNION ALL SELECT coalesce(subreddit_name, 'unknown'), 'comment', created_at::date "
+    "FROM comments) AS stored "
+    "WHERE NOT EXISTS (SELECT 1 FROM lead_stats) "
+    "GROUP BY subreddit_name, source, day",
+]
+
+# ts_headline settings: a few short fragments around the matches
+SEARCH_HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10"
+)
+
+# Lead sources served by get_leads and the tables they are stored in
+LEAD_SOURCES = ("post", "comment")
+TABLES_BY_SOURCE = {"post": "leads", "comment": "comments"}
+
+# Process-wide engine and session factory, created on first use
+_engine = None
+_session_factory = None
+
+
+def get_engine():
+    """
+    Get the process-wide async engine, creating it on first use
+
+    Returns:
+        AsyncEngine: Engine with a connection pool shared by every caller
+    """
+    global _engine, _session_factory
+    if _engine is None:
+        _engine = create_async_engine(
+            re.sub(
+                r"^postgresql:", "postgresql+asyncpg:", os.getenv("DATABASE_URL") or ""
+            ),
+            echo=DB_ECHO,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        _session_factory = async_sessionmaker(bind=_engine)
+    return _engine
+
+
+def get_session():
+    """Open a session on the shared engine, use as `async with get_session()`"""
+    get_engine()
+    return _session_factory()
+
 
 async def init_db():
-    """Initialize the database and create tables if they don't exist"""
-    engine = create_async_engine(
-        re.sub(r"^postgresql:", "postgresql+asyncpg:", os.getenv("DATABASE_URL") or ""),
-        echo=True,
-    )
+    """
+    Create tables if they don't exist
+
+    Runs once at startup, not on every query.
+    """
+    engine = get_engine()
     async with engine.begin() as conn:
-        # Create tables if they don't exist
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips existing tables, add columns introduced since
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
     return engine
 
 
-async def save_leads(url_description_map: dict):
+async def close_db():
+    """Close every pooled connection, e.g. on application shutdown"""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+
+async def insert_leads(leads: list):
+    """
+    Insert leads that are not stored yet with bulk INSERT ... ON CONFLICT DO NOTHING
+
+    Post leads go to the leads table and comment leads to the comments
+    table, both with the metadata extracted from Reddit. The lead_stats
+    counters are incremented for the inserted rows in the same transaction.
+
+    Args:
+        leads (list): Dicts as returned by url_mapper.join_sources
+
+    Returns:
+        list: post_ids and comment_ids of the newly inserted leads
+    """
+    post_rows = [
+        {
+            "post_id": lead["id"],
+            "title": (lead["title"] or "")[:500],
+            "post_text": lead["text"],
+            "url": lead["url"],
+            "subreddit_name": lead["subreddit"] or "unknown",
+            "description": lead["description"],
+            "score": lead["score"],
+        }
+        for lead in leads
+        if lead["kind"] == "post"
+    ]
+    comment_rows = [
+        {
+            "comment_id": lead["id"],
+            "text": lead["text"] or "",
+            "description": lead["description"],
+            "subreddit_name": lead["subreddit"] or "unknown",
+            "post_id": lead["post_id"],
+            "url": lead["url"],
+            "score": lead["score"],
+        }
+        for lead in leads
+        if lead["kind"] == "comment"
+    ]
+
+    inserted = []
+    counts = Counter()
+    day = datetime.utcnow().date()
+    async with get_session() as session:
+        # One statement per chunk, all chunks in one transaction
+        for source, model, rows, key in (
+            ("post", Lead, post_rows, Lead.post_id),
+            ("comment", Comment, comment_rows, Comment.comment_id),
+        ):
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                stmt = (
+                    insert(model)
+                    .values(rows[start : start + INSERT_CHUNK_SIZE])
+                    .on_conflict_do_nothing(index_elements=[key.key])
+                    .returning(key, model.subreddit_name)
+                )
+                result = await session.execute(stmt)
+                for lead_id, subreddit_name in result:
+                    inserted.append(lead_id)
+                    counts[(subreddit_name, source)] += 1
+
+        if counts:
+            # Sorted so concurrent batches lock the counter rows in the same order
+            stmt = insert(LeadStat).values(
+                [
+                    {
+                        "subreddit_name": subreddit_name,
+                        "source": source,
+                        "day": day,
+                        "count": count,
+                    }
+                    for (subreddit_name, source), count in sorted(counts.items())
+                ]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["subreddit_name", "source", "day"],
+                set_={"count": LeadStat.count + stmt.excluded.count},
+            )
+            await session.execute(stmt)
+        await session.commit()
+    return inserted
+
+
+async def save_leads(url_description_map: dict, sources: dict):
     """
     Save leads to the database
 
     Args:
         url_description_map (dict): Dictionary with URLs as keys and descriptions as values
+        sources (dict): Reddit id -> item_source index of the extracted
+            items, see url_mapper.build_source_index; leads missing from it
+            are dropped
+
+    Returns:
+        int: Number of leads that were not stored before
     """
-    engine = await init_db()
-    SessionLocal = async_sessionmaker(bind=engine)
+    return len(await insert_leads(join_sources(url_description_map, sources)))
 
-    async with SessionLocal() as session:
-        for url, description in url_description_map.items():
-            # Extract ID from URL (assuming format https://reddit.com/comments/{id})
-            post_id = url.split("/")[-1] if "/" in url else url
 
-            # Check if lead already exists
-            stmt = select(Lead).where(Lead.post_id == post_id)
-            result = await session.execute(stmt)
-            existing_lead = result.scalar_one_or_none()
-
-            if not existing_lead:
-                # Create new lead
-                lead = Lead(
-                    post_id=post_id,
-                    title=f"Lead from {post_id}",
-                    post_text=description,
-                    url=url,
-                    subreddit_name="unknown",  # We don't have this info in the current data structure
-                )
-                session.add(lead)
+async def save_lead_profiles(profile: str, url_description_map: dict):
+    """
+    Tag leads with the service profile they were found for
 
-        await session.commit()
+    Args:
+        profile (str): Name of the service profile
+        url_description_map (dict): Dictionary with URLs as keys and descriptions as values
+    """
+    if not url_description_map:
+        return
+
+    try:
+        async with get_session() as session:
+            rows = [
+                {
+                    # Extract ID from URL (assuming format https://reddit.com/comments/{id})
+                    "item_id": url.split("/")[-1] if "/" in url else url,
+                    "profile": profile,
+                    "description": description,
+                }
+                for url, description in url_description_map.items()
+            ]
+            stmt = insert(LeadProfile).values(rows)
+            stmt = stmt.on_conflict_do_nothing(index_elements=["item_id", "profile"])
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"Error saving lead profiles for {profile}: {e}")
 
 
 async def get_scanned_subreddits():
@@ -63,11 +278,8 @@ async def get_scanned_subreddits():
     Returns:
         list: List of subreddit names
     """
-    engine = await init_db()
-    SessionLocal = async_sessionmaker(bind=engine)
-
     try:
-        async with SessionLocal() as session:
+        async with get_session() as session:
             stmt = select(SubredditToScan.name).where(SubredditToScan.is_active == True)
             result = await session.execute(stmt)
             return [row[0] for row in result.fetchall()]
@@ -83,11 +295,8 @@ async def save_scanned_subreddit(subreddit_name: str):
     Args:
         subreddit_name (str): Name of the subreddit
     """
-    engine = await init_db()
-    SessionLocal = async_sessionmaker(bind=engine)
-
     try:
-        async with SessionLocal() as session:
+        async with get_session() as session:
             # Use INSERT ... ON CONFLICT to avoid duplicates
             stmt = insert(SubredditToScan).values(name=subreddit_name, is_active=True)
             stmt = stmt.on_conflict_do_nothing(index_elements=["name"])
@@ -97,30 +306,663 @@ async def save_scanned_subreddit(subreddit_name: str):
         print(f"Error saving scanned subreddit {subreddit_name}: {e}")
 
 
-async def get_leads(limit: int = 100, offset: int = 0):
+async def get_keywords():
+    """
+    Get all configured prefilter keywords
+
+    Returns:
+        list: List of keywords
+    """
+    try:
+        async with get_session() as session:
+            stmt = select(Keyword.keyword).order_by(Keyword.keyword)
+            result = await session.execute(stmt)
+            return [row[0] for row in result.fetchall()]
+    except Exception as e:
+        print(f"Error getting keywords: {e}")
+        return []
+
+
+async def save_keyword(keyword: str):
+    """
+    Save a prefilter keyword
+
+    Args:
+        keyword (str): Keyword to add
+    """
+    try:
+        async with get_session() as session:
+            stmt = insert(Keyword).values(keyword=keyword)
+            stmt = stmt.on_conflict_do_nothing(index_elements=["keyword"])
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"Error saving keyword {keyword}: {e}")
+
+
+async def delete_keyword(keyword: str):
+    """
+    Delete a prefilter keyword
+
+    Args:
+        keyword (str): Keyword to remove
+    """
+    try:
+        async with get_session() as session:
+            stmt = delete(Keyword).where(Keyword.keyword == keyword)
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"Error deleting keyword {keyword}: {e}")
+
+
+async def get_subreddit_cursors(subreddit_names: list):
+    """
+    Get the incremental scan cursors of the given subreddits
+
+    Args:
+        subreddit_names (list): Names of the subreddits about to be scanned
+
+    Returns:
+        dict: Subreddit name -> cursor dict, subreddits never scanned are missing
+    """
+    try:
+        async with get_session() as session:
+            stmt = select(SubredditCursor).where(
+                SubredditCursor.name.in_(subreddit_names)
+            )
+            result = await session.execute(stmt)
+            return {
+                cursor.name: {
+                    "last_post_fullname": cursor.last_post_fullname,
+                    "last_post_created_utc": cursor.last_post_created_utc,
+                    "last_comment_created_utc": cursor.last_comment_created_utc,
+                }
+                for cursor in result.scalars().all()
+            }
+    except Exception as e:
+        print(f"Error getting subreddit cursors: {e}")
+        return {}  # Fall back to a full scan
+
+
+async def save_subreddit_cursors(cursors: dict):
+    """
+    Persist the incremental scan cursors of scanned subreddits
+
+    Args:
+        cursors (dict): Subreddit name -> cursor dict as returned by
+            reddit_data_extractor.advance_cursors
+    """
+    if not cursors:
+        return
+
+    try:
+        async with get_session() as session:
+            for name, cursor in cursors.items():
+                stmt = insert(SubredditCursor).values(name=name, **cursor)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["name"],
+                    set_={**cursor, "updated_at": datetime.utcnow()},
+                )
+                await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"Error saving subreddit cursors: {e}")
+
+
+async def get_cached_classifications(cache_keys: list, ttl: timedelta):
+    """
+    Get stored AI verdicts that are younger than the TTL
+
+    Args:
+        cache_keys (list): Cache keys to look up
+        ttl (timedelta): Maximum age of a usable verdict
+
+    Returns:
+        dict: Cache key -> (is_lead, description, created_at) for every hit
+    """
+    if not cache_keys:
+        return {}
+
+    try:
+        async with get_session() as session:
+            stmt = select(
+                ClassificationCacheEntry.cache_key,
+                ClassificationCacheEntry.is_lead,
+                ClassificationCacheEntry.description,
+                ClassificationCacheEntry.created_at,
+            ).where(
+                ClassificationCacheEntry.cache_key.in_(cache_keys),
+                ClassificationCacheEntry.created_at > datetime.utcnow() - ttl,
+            )
+            result = await session.execute(stmt)
+            return {row[0]: (row[1], row[2], row[3]) for row in result.fetchall()}
+    except Exception as e:
+        print(f"Error getting cached classifications: {e}")
+        return {}  # Treat everything as a miss
+
+
+async def save_classifications(entries: list):
+    """
+    Store AI verdicts in the classification cache
+
+    Args:
+        entries (list): Dicts with cache_key, item_id, model, is_lead and description
+    """
+    if not entries:
+        return
+
+    try:
+        async with get_session() as session:
+            stmt = insert(ClassificationCacheEntry).values(
+                [{**entry, "created_at": datetime.utcnow()} for entry in entries]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["cache_key"],
+                set_={
+                    "is_lead": stmt.excluded.is_lead,
+                    "description": stmt.excluded.description,
+                    "created_at": stmt.excluded.created_at,
+                },
+            )
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"Error saving classifications: {e}")
+
+
+async def save_seen_items(item_ids: list):
     """
-    Get leads from the database
+    Record the post and comment ids processed by a scheduled run
+
+    Args:
+        item_ids (list): post_ids and comment_ids, already stored ones are skipped
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    try:
+        async with get_session() as session:
+            for start in range(0, len(item_ids), INSERT_CHUNK_SIZE):
+                stmt = (
+                    insert(SeenItem)
+                    .values(
+                        [
+                            {"item_id": item_id}
+                            for item_id in item_ids[start : start + INSERT_CHUNK_SIZE]
+                        ]
+                    )
+                    .on_conflict_do_nothing(index_elements=["item_id"])
+                )
+                await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        # The items are simply processed again by a later run
+        print(f"Error saving seen items: {e}")
+
+
+async def count_seen_items():
+    """
+    Count the ids processed by scheduled runs
+
+    Returns:
+        int: Number of recorded ids
+    """
+    async with get_session() as session:
+        result = await session.execute(select(func.count()).select_from(SeenItem))
+        return result.scalar_one()
+
+
+async def iter_seen_items(batch_size: int = 10000):
+    """
+    Stream the ids processed by scheduled runs without loading them all at once
+
+    Args:
+        batch_size (int): Rows fetched from the server-side cursor at a time
+
+    Yields:
+        str: post_id or comment_id
+    """
+    async with get_session() as session:
+        stmt = select(SeenItem.item_id).execution_options(yield_per=batch_size)
+        async for item_id in await session.stream_scalars(stmt):
+            yield item_id
+
+
+async def purge_expired_seen_items(ttl: timedelta):
+    """
+    Forget processed ids older than the TTL, so they drop out at the next rebuild
+
+    Args:
+        ttl (timedelta): How long an id stays recorded
+    """
+    try:
+        async with get_session() as session:
+            stmt = delete(SeenItem).where(
+                SeenItem.created_at <= datetime.utcnow() - ttl
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+            print(f"Purged {result.rowcount} expired seen items")
+    except Exception as e:
+        print(f"Error purging expired seen items: {e}")
+
+
+async def purge_expired_classifications(ttl: timedelta):
+    """
+    Delete cached AI verdicts older than the TTL
+
+    Args:
+        ttl (timedelta): Maximum age of a cached verdict
+    """
+    try:
+        async with get_session() as session:
+            stmt = delete(ClassificationCacheEntry).where(
+                ClassificationCacheEntry.created_at <= datetime.utcnow() - ttl
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+            print(f"Purged {result.rowcount} expired classifications")
+    except Exception as e:
+        print(f"Error purging expired classifications: {e}")
+
+
+def encode_cursor(row, ranked: bool = False) -> str:
+    """Opaque cursor pointing just past a lead row of get_leads or search_leads"""
+    values = [row.created_at.isoformat(), row.source, row.id]
+    if ranked:
+        values.insert(0, row.rank)
+    raw = json.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, ranked: bool = False):
+    """
+    Decode a cursor from encode_cursor
+
+    Returns:
+        tuple: ([rank,] created_at, source, id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor))
+        rank = [float(values.pop(0))] if ranked else []
+        created_at, source, lead_id = values
+        if source not in LEAD_SOURCES:
+            raise ValueError(source)
+        return (*rank, datetime.fromisoformat(created_at), source, int(lead_id))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _after_cursor(source: str, model, keys: list, after: tuple):
+    """
+    Keyset condition selecting the rows of one lead table after a cursor
+
+    Rows are ordered by keys, then source, then id, all descending. Since
+    the source is constant within a table, only the cursor's own table
+    needs the id, and ties on keys are kept or dropped by the source order
+    ("post" before "comment").
+
+    Args:
+        source (str): Source of the table, "post" or "comment"
+        model: Lead or Comment
+        keys (list): Sort expressions before the source, e.g. [created_at]
+        after (tuple): Decoded cursor, the key values then source and id
+    """
+    *values, after_source, after_id = after
+    if source == after_source:
+        return tuple_(*keys, model.id) < (*values, after_id)
+    if source < after_source:
+        return tuple_(*keys) <= tuple(values)
+    return tuple_(*keys) < tuple(values)
+
+
+def _lead_select(source: str, subreddit: str = None, min_score: int = None):
+    """Select post or comment leads with the columns both tables share"""
+    if source == "post":
+        model = Lead
+        columns = [
+            Lead.post_id.label("item_id"),
+            Lead.post_id,
+            Lead.title,
+            Lead.post_text.label("text"),
+        ]
+    else:
+        model = Comment
+        columns = [
+            Comment.comment_id.label("item_id"),
+            Comment.post_id,
+            null().label("title"),
+            Comment.text,
+        ]
+    stmt = select(
+        literal(source).label("source"),
+        model.id,
+        *columns,
+        model.url,
+        model.subreddit_name,
+        model.description,
+        model.score,
+        model.created_at,
+        model.updated_at,
+    )
+    if subreddit:
+        stmt = stmt.where(model.subreddit_name == subreddit)
+    if min_score is not None:
+        stmt = stmt.where(model.score >= min_score)
+    return stmt, model
+
+
+async def get_leads(
+    limit: int = 100,
+    offset: int = 0,
+    cursor: str = None,
+    subreddit: str = None,
+    source: str = None,
+    min_score: int = None,
+):
+    """
+    Get post and comment leads from the database, newest first
+
+    Pages are read with keyset pagination on (created_at, source, id), so a
+    deep page costs the same as the first one: every table is read through
+    its (created_at, id) index starting right after the cursor.
 
     Args:
         limit (int): Maximum number of leads to return
-        offset (int): Number of leads to skip
+        offset (int): Number of leads to skip after the cursor; prefer cursors
+        cursor (str): next_cursor of the previous page, None for the first page
+        subreddit (str): Only leads from this subreddit
+        source (str): "post" or "comment", None for both
+        min_score (int): Only leads whose Reddit score is at least this
 
     Returns:
-        list: List of leads
+        tuple: (rows, next_cursor); rows have source, id, item_id, post_id,
+        title, text, url, subreddit_name, description, score, created_at and
+        updated_at, next_cursor is None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed
     """
-    engine = await init_db()
-    SessionLocal = async_sessionmaker(bind=engine)
+    after = decode_cursor(cursor) if cursor else None
+    sources = [source] if source else LEAD_SOURCES
+    window = offset + limit + 1
+
+    branches = []
+    for name in sources:
+        stmt, model = _lead_select(name, subreddit, min_score)
+        if after:
+            stmt = stmt.where(_after_cursor(name, model, [model.created_at], after))
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(window)
+        branches.append(stmt)
+
+    union = union_all(*branches).subquery()
+    stmt = (
+        select(union)
+        .order_by(union.c.created_at.desc(), union.c.source.desc(), union.c.id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+    )
 
     try:
-        async with SessionLocal() as session:
-            stmt = select(Lead).offset(offset).limit(limit)
+        async with get_session() as session:
             result = await session.execute(stmt)
-            return result.scalars().all()
+            rows = result.all()
     except Exception as e:
         print(f"Error getting leads: {e}")
-        return []
+        return [], None
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def iter_leads(
+    subreddit: str = None,
+    source: str = None,
+    min_score: int = None,
+    batch_size: int = 1000,
+):
+    """
+    Stream every lead matching the filters through a server-side cursor
+
+    Only batch_size rows are held in memory at a time, however many leads
+    are stored. Post leads come first, then comment leads, each newest first.
+
+    Args:
+        subreddit (str): Only leads from this subreddit
+        source (str): "post" or "comment", None for both
+        min_score (int): Only leads whose Reddit score is at least this
+        batch_size (int): Rows fetched from the cursor at a time
+
+    Yields:
+        Row: Rows with the same columns as get_leads
+    """
+    async with get_session() as session:
+        for name in [source] if source else LEAD_SOURCES:
+            stmt, model = _lead_select(name, subreddit, min_score)
+            stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+            result = await session.stream(
+                stmt.execution_options(yield_per=batch_size)
+            )
+            async for row in result:
+                yield row
+
+
+async def search_leads(
+    query: str,
+    limit: int = 20,
+    cursor: str = None,
+    subreddit: str = None,
+    source: str = None,
+    min_score: int = None,
+):
+    """
+    Full-text search over post and comment leads, best matches first
+
+    The query uses web search syntax ("logo -fiverr", "\"landing page\"",
+    "react or vue") and is matched against the GIN-indexed search_vector
+    columns. Pages are keyset-paginated on (rank, created_at, source, id).
+    Highlights are computed for the returned page only.
+
+    Args:
+        query (str): Search text
+        limit (int): Maximum number of leads to return
+        cursor (str): next_cursor of the previous page, None for the first page
+        subreddit (str): Only leads from this subreddit
+        source (str): "post" or "comment", None for both
+        min_score (int): Only leads whose Reddit score is at least this
+
+    Returns:
+        tuple: (rows, next_cursor); rows have the get_leads columns plus rank
+        and headline, the matching text with matches wrapped in <mark>
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    after = decode_cursor(cursor, ranked=True) if cursor else None
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    sources = [source] if source else LEAD_SOURCES
+
+    branches = []
+    for name in sources:
+        stmt, model = _lead_select(name, subreddit, min_score)
+        rank = func.ts_rank(model.search_vector, tsquery)
+        stmt = stmt.add_columns(rank.label("rank")).where(
+            model.search_vector.op("@@")(tsquery)
+        )
+        if after:
+            keys = [rank, model.created_at]
+            stmt = stmt.where(_after_cursor(name, model, keys, after))
+        stmt = stmt.order_by(
+            rank.desc(), model.created_at.desc(), model.id.desc()
+        ).limit(limit + 1)
+        branches.append(stmt)
+
+    union = union_all(*branches).subquery()
+    order = [
+        union.c.rank.desc(),
+        union.c.created_at.desc(),
+        union.c.source.desc(),
+        union.c.id.desc(),
+    ]
+    page = select(union).order_by(*order).limit(limit + 1).subquery()
+    stmt = select(
+        page,
+        func.ts_headline(
+            SEARCH_CONFIG,
+            func.concat_ws(" ", page.c.title, page.c.text),
+            tsquery,
+            SEARCH_HEADLINE_OPTIONS,
+        ).label("headline"),
+    ).order_by(
+        page.c.rank.desc(),
+        page.c.created_at.desc(),
+        page.c.source.desc(),
+        page.c.id.desc(),
+    )
+
+    try:
+        async with get_session() as session:
+            result = await session.execute(stmt)
+            rows = result.all()
+    except Exception as e:
+        print(f"Error searching leads: {e}")
+        return [], None
+
+    next_cursor = (
+        encode_cursor(rows[limit - 1], ranked=True) if len(rows) > limit else None
+    )
+    return rows[:limit], next_cursor
+
+
+async def count_leads(subreddit: str = None, source: str = None, min_score: int = None):
+    """
+    Count leads matching the filters
+
+    Without filters the planner's row estimate (pg_class.reltuples) is used,
+    which costs nothing however large the tables grow; filtered totals are
+    counted exactly through the indexes.
+
+    Returns:
+        tuple: (total, is_estimate)
+    """
+    sources = [source] if source else LEAD_SOURCES
+    tables = [TABLES_BY_SOURCE[name] for name in sources]
+
+    try:
+        async with get_session() as session:
+            if not subreddit and min_score is None:
+                stmt = text(
+                    "SELECT SUM(GREATEST(reltuples, 0)), MIN(reltuples) FROM pg_class "
+                    "WHERE oid = ANY(CAST(:tables AS regclass[]))"
+                )
+                result = await session.execute(stmt, {"tables": tables})
+                estimate, least = result.one()
+                # reltuples is -1 until a table was vacuumed or analyzed
+                if least is not None and least >= 0:
+                    return int(estimate), True
+
+            total = 0
+            for name in sources:
+                stmt, _ = _lead_select(name, subreddit, min_score)
+                result = await session.execute(
+                    select(func.count()).select_from(stmt.subquery())
+                )
+                total += result.scalar_one()
+            return total, False
+    except Exception as e:
+        print(f"Error counting leads: {e}")
+        return 0, False
+
+
+async def save_scan(
+    started_at: datetime,
+    status: str,
+    subreddits: int = 0,
+    items_extracted: int = 0,
+    leads_found: int = 0,
+):
+    """
+    Record a finished scan in the scan history
+
+    Args:
+        started_at (datetime): UTC time the scan started
+        status (str): "completed" or "failed"
+        subreddits (int): Number of subreddits scanned, 0 for the default list
+        items_extracted (int): Posts and comments read from Reddit
+        leads_found (int): Leads returned by the scan
+    """
+    async with get_session() as session:
+        try:
+            session.add(
+                ScanHistory(
+                    started_at=started_at,
+                    finished_at=datetime.utcnow(),
+                    status=status,
+                    subreddits=subreddits,
+                    items_extracted=items_extracted,
+                    leads_found=leads_found,
+                )
+            )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            print(f"Error saving scan history: {e}")
+
+
+async def get_stats():
+    """
+    Read the dashboard statistics from the maintained aggregates
+
+    Lead counts are summed from lead_stats, which holds one row per
+    subreddit, source and day, so the cost does not grow with the number of
+    stored leads. The last scan is the newest completed scan_history entry
+    and the size covers the tables of this application, indexes included.
+
+    Returns:
+        dict: total_leads, leads_by_subreddit, leads_by_source, last_scan
+        and database_size
+    """
+    table_sizes = [
+        func.coalesce(func.pg_total_relation_size(func.to_regclass(table)), 0)
+        for table in Base.metadata.tables
+    ]
+    async with get_session() as session:
+        by_subreddit = await session.execute(
+            select(LeadStat.subreddit_name, func.sum(LeadStat.count)).group_by(
+                LeadStat.subreddit_name
+            )
+        )
+        by_source = await session.execute(
+            select(LeadStat.source, func.sum(LeadStat.count)).group_by(LeadStat.source)
+        )
+        last_scan = await session.scalar(
+            select(func.max(ScanHistory.finished_at)).where(
+                ScanHistory.status == "completed"
+            )
+        )
+        database_size = await session.scalar(
+            select(func.pg_size_pretty(sum(table_sizes[1:], table_sizes[0])))
+        )
+
+    leads_by_subreddit = {name: int(count) for name, count in by_subreddit}
+    leads_by_source = {source: 0 for source in LEAD_SOURCES}
+    leads_by_source.update({source: int(count) for source, count in by_source})
+    return {
+        "total_leads": sum(leads_by_source.values()),
+        "leads_by_subreddit": leads_by_subreddit,
+        "leads_by_source": leads_by_source,
+        "last_scan": last_scan,
+        "database_size": database_size,
+    }
 
 
 # For testing purposes
 if __name__ == "__main__":
-    asyncio.run(init_db())
+
+    async def main():
+        await init_db()
+        await close_db()
+
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+import hashlib
+import os
+from collections import OrderedDict, defaultdict
+import numpy as np
+from dotenv import load_dotenv
+from prefilter import tokenize, item_text
+from reddit_data_extractor import item_id, item_kind
+
+load_dotenv()
+
+# Set to "0" to classify every item even if it is a near-duplicate
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+# Items whose SimHashes differ in at most this many bits are near-duplicates
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+# Items with fewer tokens are too short to fingerprint reliably and are kept
+DEDUP_MIN_TOKENS = int(os.getenv("DEDUP_MIN_TOKENS", "5"))
+# Number of recently classified representatives remembered across runs
+DEDUP_HISTORY_SIZE = int(os.getenv("DEDUP_HISTORY_SIZE", "20000"))
+
+SIMHASH_BITS = 64
+# LSH bands: two fingerprints within DEDUP_MAX_DISTANCE bits share at least
+# one band exactly as long as there are more bands than allowed differing bits
+BANDS = max(4, DEDUP_MAX_DISTANCE + 1)
+_BIT_POSITIONS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+def simhash(text: str):
+    """
+    Compute the 64-bit SimHash of text over words and word bigrams
+
+    Args:
+        text (str): Text to fingerprint
+
+    Returns:
+        int: The fingerprint, or None if the text has fewer than DEDUP_MIN_TOKENS tokens
+    """
+    tokens = tokenize(text)
+    if len(tokens) < DEDUP_MIN_TOKENS:
+        return None
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    digests = [hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest() for f in features]
+    hashes = np.array([int.from_bytes(d, "big") for d in digests], dtype=np.uint64)
+    # Every feature votes +1 or -1 on each bit, the sign of the sum is the bit
+    bits = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).astype(np.int64)
+    votes = (2 * bits - 1).sum(axis=0)
+    return sum(1 << i for i in np.flatnonzero(votes > 0).tolist())
+
+
+def _bands(signature: int):
+    width = -(-SIMHASH_BITS // BANDS)
+    mask = (1 << width) - 1
+    return [(band, (signature >> (band * width)) & mask) for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    SimHash fingerprints of recently classified items, bucketed by LSH band
+
+    Each remembered item is the representative of its cluster. A new item
+    that lands within DEDUP_MAX_DISTANCE bits of one joins that cluster
+    instead of being classified again.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # item id -> (signature, item), oldest first
+        self.items = OrderedDict()
+        self.buckets = defaultdict(set)
+
+    def find(self, signature: int):
+        """Return the id of a remembered near-duplicate, or None"""
+        for band in _bands(signature):
+            for candidate in self.buckets.get(band, ()):
+                other, _ = self.items[candidate]
+                if (signature ^ other).bit_count() <= DEDUP_MAX_DISTANCE:
+                    return candidate
+        return None
+
+    def get(self, key: str):
+        self.items.move_to_end(key)
+        return self.items[key][1]
+
+    def add(self, key: str, signature: int, item: dict):
+        self.items[key] = (signature, item)
+        for band in _bands(signature):
+            self.buckets[band].add(key)
+        while len(self.items) > self.max_size:
+            old_key, (old_signature, _) = self.items.popitem(last=False)
+            for band in _bands(old_signature):
+                self.buckets[band].discard(old_key)
+                if not self.buckets[band]:
+                    del self.buckets[band]
+
+
+# Process-wide history, so reposts of recently classified items are collapsed too
+near_duplicate_index = NearDuplicateIndex(DEDUP_HISTORY_SIZE)
+
+
+def collapse_duplicates(posts_dict: list, posts_comments: list):
+    """
+    Keep one representative per cluster of near-duplicate items
+
+    Items are clustered within the batch and against the representatives of
+    recent batches. When the representative comes from history it is sent
+    in place of its duplicates; the classification cache then usually
+    answers it without an AI call.
+
+    Args:
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+
+    Returns:
+        tuple: (posts, comments, clusters) where posts and comments are the
+        representatives and clusters maps a representative's id to the items
+        of this batch its verdict applies to
+    """
+    if not DEDUP_ENABLED:
+        return posts_dict, posts_comments, {}
+
+    representatives = []
+    clusters = {}
+    for item in posts_dict + posts_comments:
+        key = item_id(item)
+        signature = simhash(item_text(item))
+        if signature is None:
+            representatives.append(item)
+            continue
+
+        rep = near_duplicate_index.find(signature)
+        if rep in clusters:
+            # Also the original itself, after a repost pulled it from history
+            clusters[rep].append(item)
+        elif rep is None or rep == key:
+            near_duplicate_index.add(key, signature, item)
+            representatives.append(item)
+            clusters[key] = [item]
+        else:
+            # Representative from an earlier batch, not itself part of this one
+            representatives.append(near_duplicate_index.get(rep))
+            clusters[rep] = [item]
+
+    # Singleton clusters of a batch item need no fan-out
+    clusters = {
+        rep: members
+        for rep, members in clusters.items()
+        if len(members) > 1 or item_id(members[0]) != rep
+    }
+    # One verdict per id, two copies would share a classification cache key
+    unique = {}
+    for item in representatives:
+        unique.setdefault(item_id(item), item)
+    representatives = list(unique.values())
+    kept_posts = [item for item in representatives if item_kind(item) == "post"]
+    kept_comments = [item for item in representatives if item_kind(item) == "comment"]
+    if clusters:
+        members = sum(len(items) for items in clusters.values())
+        print(
+            f"Dedup collapsed {members} near-duplicate items into "
+            f"{len(clusters)} representatives"
+        )
+    return kept_posts, kept_comments, clusters
+
+
+def fan_out(key: str, lead: dict, clusters: dict):
+    """
+    Apply a representative's lead verdict to every member of its cluster
+
+    Args:
+        key (str): "post_leads" or "comment_leads"
+        lead (dict): Lead with the representative's id and a description
+        clusters (dict): Clusters returned by collapse_duplicates
+
+    Returns:
+        list: (key, lead) pairs, one per item of the batch the lead covers
+    """
+    members = clusters.get(lead.get("id"))
+    if members is None:
+        return [(key, lead)]
+    return [
+        (f"{item_kind(member)}_leads", {**lead, "id": item_id(member)})
+        for member in members
+    ]
+
+
+def fan_out_leads(ai_output: dict, clusters: dict):
+    """
+    Apply fan_out to all leads returned by find_leads
+
+    Returns:
+        dict: A copy of ai_output whose post_leads and comment_leads cover
+        every member of the clusters
+    """
+    if not clusters:
+        return ai_output
+    expanded = {**ai_output, "post_leads": [], "comment_leads": []}
+    for key in ("post_leads", "comment_leads"):
+        for lead in ai_output.get(key) or []:
+            for member_key, member_lead in fan_out(key, lead, clusters):
+                expanded[member_key].append(member_lead)
+    return expanded
+
+
+# For testing purposes
+if __name__ == "__main__":
+    text = "Looking for a web developer to rebuild our Shopify store this month"
+
+    def post(post_id):
+        return {"post_id": post_id, "data": {"title": text, "post_text": ""}}
+
+    # The original was classified in an earlier run
+    collapse_duplicates([post("r")], [])
+    # A repost listed before the original in the next batch
+    posts, comments, clusters = collapse_duplicates([post("A"), post("r")], [])
+    print("Representatives:", [item_id(item) for item in posts])
+    print(
+        "Clusters:",
+        {rep: [item_id(item) for item in items] for rep, items in clusters.items()},
+    )
+    assert [item_id(item) for item in posts] == ["r"]
+    assert [item_id(item) for item in clusters["r"]] == ["A", "r"]
+    leads = fan_out_leads({"post_leads": [{"id": "r", "description": "d"}]}, clusters)
+    assert [lead["id"] for lead in leads["post_leads"]] == ["A", "r"]
+    print("Repost before its original: OK")
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+
+# Columns of an exported lead, in CSV column order
+EXPORT_FIELDS = [
+    "source",
+    "id",
+    "item_id",
+    "post_id",
+    "title",
+    "text",
+    "url",
+    "subreddit_name",
+    "description",
+    "score",
+    "created_at",
+    "updated_at",
+]
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Bytes buffered before a chunk is handed to the writer
+CHUNK_SIZE = 64 * 1024
+
+
+def lead_record(row) -> dict:
+    """Plain dict of a lead row from db.get_leads or db.iter_leads"""
+    record = {field: getattr(row, field) for field in EXPORT_FIELDS}
+    for field in ("created_at", "updated_at"):
+        if record[field] is not None:
+            record[field] = record[field].isoformat()
+    return record
+
+
+async def export_chunks(rows, export_format: str):
+    """
+    Serialize streamed lead rows as NDJSON or CSV, a chunk at a time
+
+    Args:
+        rows: Async iterator of lead rows, e.g. db.iter_leads()
+        export_format (str): "ndjson" or "csv"
+
+    Yields:
+        str: Chunks of about CHUNK_SIZE characters; the CSV header comes first
+    """
+    buffer = io.StringIO()
+    writer = None
+    if export_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    async for row in rows:
+        record = lead_record(row)
+        if writer:
+            writer.writerow(record)
+        else:
+            buffer.write(json.dumps(record, ensure_ascii=False))
+            buffer.write("\n")
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -1,36 +1,53 @@
+import argparse
 import asyncio
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-import os
-import re
+import sys
 from dotenv import load_dotenv
-from models import Lead
+from db import iter_leads, close_db, LEAD_SOURCES
+from export import export_chunks, EXPORT_FORMATS
 
 load_dotenv()
 
-async def get_leads():
-    """Retrieve all leads from the database"""
-    engine = create_async_engine(
-        re.sub(r"^postgresql:", "postgresql+asyncpg:", os.getenv("DATABASE_URL") or ""),
-        echo=True,
-    )
-    SessionLocal = async_sessionmaker(bind=engine)
-    
-    async with SessionLocal() as session:
-        stmt = select(Lead)
-        result = await session.execute(stmt)
-        leads = result.scalars().all()
-        
-        print(f"Found {len(leads)} leads:")
-        for lead in leads:
-            print(f"  ID: {lead.post_id}")
-            print(f"  Title: {lead.title}")
-            print(f"  Description: {lead.post_text}")
-            print(f"  URL: {lead.url}")
-            print(f"  Subreddit: {lead.subreddit_name}")
-            print("---")
-        
-        return leads
+async def get_leads(subreddit=None, source=None, min_score=None):
+    """Print all leads from the database, streamed through a server-side cursor"""
+    count = 0
+    async for lead in iter_leads(subreddit=subreddit, source=source, min_score=min_score):
+        count += 1
+        print(f"  ID: {lead.item_id} ({lead.source})")
+        print(f"  Title: {lead.title}")
+        print(f"  Description: {lead.description}")
+        print(f"  URL: {lead.url}")
+        print(f"  Subreddit: {lead.subreddit_name}")
+        print("---")
+
+    print(f"Found {count} leads")
+    return count
+
+async def export_leads(output, export_format, subreddit=None, source=None, min_score=None):
+    """Write all leads as NDJSON or CSV to output, chunk by chunk"""
+    rows = iter_leads(subreddit=subreddit, source=source, min_score=min_score)
+    async for chunk in export_chunks(rows, export_format):
+        output.write(chunk)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Print or export stored leads")
+    parser.add_argument("--format", choices=["text", *EXPORT_FORMATS], default="text")
+    parser.add_argument("--output", help="File to write the export to, default stdout")
+    parser.add_argument("--subreddit")
+    parser.add_argument("--source", choices=LEAD_SOURCES)
+    parser.add_argument("--min-score", type=int)
+    args = parser.parse_args()
+    filters = dict(subreddit=args.subreddit, source=args.source, min_score=args.min_score)
+
+    try:
+        if args.format == "text":
+            await get_leads(**filters)
+        elif args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as output:
+                await export_leads(output, args.format, **filters)
+        else:
+            await export_leads(sys.stdout, args.format, **filters)
+    finally:
+        await close_db()
 
 if __name__ == "__main__":
-    asyncio.run(get_leads())
\ No newline at end of file
+    asyncio.run(main())
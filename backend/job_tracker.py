@@ -18,7 +18,10 @@ class SearchJob:
         self.results = {
             "posts_processed": 0,
             "comments_processed": 0,
-            "leads_found": 0
+            "leads_found": 0,
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "failed_ai_calls": 0
         }
         self.error: Optional[str] = None
         self.created_at = datetime.utcnow()
@@ -32,10 +35,15 @@ class SearchJob:
         self.progress = progress
         self.updated_at = datetime.utcnow()
 
-    def update_results(self, posts_processed: int = 0, comments_processed: int = 0, leads_found: int = 0):
+    def update_results(self, posts_processed: int = 0, comments_processed: int = 0, leads_found: int = 0,
+                       prompt_tokens: int = 0, response_tokens: int = 0,
+                       failed_ai_calls: int = 0):
         self.results["posts_processed"] += posts_processed
         self.results["comments_processed"] += comments_processed
         self.results["leads_found"] += leads_found
+        self.results["prompt_tokens"] += prompt_tokens
+        self.results["response_tokens"] += response_tokens
+        self.results["failed_ai_calls"] += failed_ai_calls
         self.updated_at = datetime.utcnow()
 
     def set_error(self, error: str):
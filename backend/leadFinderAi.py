@@ -1,24 +1,82 @@
+import asyncio
+import inspect
+import json
 from dotenv import load_dotenv
 import os
 from google import genai
+from google.genai import types
+from url_mapper import parse_ai_output, LeadStreamParser
+from reddit_data_extractor import item_id, item_kind
+import classification_cache
+from resilience import call_with_resilience
+
+load_dotenv()
+
+# Model used to classify leads, also part of the classification cache key
+LEAD_MODEL = os.getenv("LEAD_MODEL", "gemini-2.5-pro")
+# Fast model scoring every item in cascade mode
+TRIAGE_MODEL = os.getenv("LEAD_TRIAGE_MODEL", "gemini-2.5-flash")
+# "single" sends everything to LEAD_MODEL, "cascade" triages with TRIAGE_MODEL first
+CLASSIFIER_MODE = os.getenv("LEAD_CLASSIFIER_MODE", "single")
+# Triage confidence at or above which an item is a lead without escalation
+CASCADE_ACCEPT_THRESHOLD = float(os.getenv("LEAD_CASCADE_ACCEPT", "0.85"))
+# Triage confidence at or below which an item is dropped without escalation
+CASCADE_REJECT_THRESHOLD = float(os.getenv("LEAD_CASCADE_REJECT", "0.15"))
+# Estimated prompt tokens allowed per AI call, the rules prompt included
+CHUNK_TOKEN_BUDGET = int(os.getenv("LEAD_CHUNK_TOKEN_BUDGET", "30000"))
+# Maximum number of chunks classified at the same time
+MAX_CONCURRENT_CALLS = int(os.getenv("LEAD_MAX_CONCURRENT_CALLS", "4"))
+# Rough characters-per-token ratio used to estimate prompt size
+CHARS_PER_TOKEN = 4
+
+# Process-wide Gemini client, created on first use and reused by every job
+_client = None
+
+
+class LeadFinderError(Exception):
+    """Raised when no AI call of a find_leads run succeeded"""
+
+    def __init__(self, message: str, failed_calls: int = 0):
+        super().__init__(message)
+        self.failed_calls = failed_calls
+
+
+def get_client():
+    """
+    Return the shared Gemini client, creating it on first use
 
-def find_leads(user_query: str, posts_dict: list, posts_comments: list):
+    GEMINI_BASE_URL points the client at another endpoint, e.g. a local
+    fake model server when testing retries and hedging.
     """
-    Find potential leads using AI analysis of Reddit posts and comments.
-    
-    Args:
-        user_query (str): Description of the user's service/product
-        posts_dict (list): List of post data from Reddit
-        posts_comments (list): List of comment data from Reddit
-        
-    Returns:
-        str: AI response (could be JSON or plain text)
+    global _client
+    if _client is None:
+        base_url = os.getenv("GEMINI_BASE_URL")
+        _client = genai.Client(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            http_options=types.HttpOptions(base_url=base_url) if base_url else None,
+        )
+    return _client
+
+
+async def close_client():
     """
-    load_dotenv()
-    
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-    
-    system_prompt = """# ROLE
+    Close the shared Gemini client
+
+    Its async HTTP connections belong to the event loop that created them, so
+    callers that run every job in a new loop close it with that loop.
+    """
+    global _client
+    if _client is not None:
+        try:
+            await _client.aio.aclose()
+            _client.close()
+        except Exception as e:
+            print(f"Error closing Gemini client: {e}")
+        _client = None
+
+
+SYSTEM_PROMPT = inspect.cleandoc(
+    """# ROLE
 
     You are a highly skilled Sales Development Representative (SDR) and Lead Qualification Specialist AI. Your expertise lies in deeply understanding a user's product or service description and then identifying potential customers from online discussions. You are an expert at looking past simple keywords to understand the underlying intent and pain points expressed in a conversation.
 
@@ -56,35 +114,15 @@ def find_leads(user_query: str, posts_dict: list, posts_comments: list):
 
     user_query: "I am a professional freelance video editor specializing in fast-paced, engaging social media content for YouTube creators and TikTok. I use Adobe Premiere Pro and After Effects to create high-retention videos."
 
-    posts:
+    Posts (one JSON object per line, "i" = id, "t" = title, "x" = text):
+    {"i":"post_111","t":"Looking for recommendations for a good YouTube editor for my gaming channel.","x":"My channel is growing but I can't keep up with the editing. Need someone who understands pacing and memes."}
+    {"i":"post_222","t":"I am a video editor available for hire!","x":"I can edit your videos, DM me for rates."}
 
-    JSON
+    Comments (one JSON object per line, "i" = id, "x" = text):
+    {"i":"comment_888","x":"Ugh, I spend more time editing my TikToks than filming them. It's exhausting, I wish I could just hand the footage off to someone."}
+    {"i":"comment_999","x":"Yeah, Adobe Premiere Pro is definitely the industry standard for a reason."}
 
-    [
-      {
-        "post_id": "post_111",
-        "data": { "Title": "Looking for recommendations for a good YouTube editor for my gaming channel.", "post_text": "My channel is growing but I can't keep up with the editing. Need someone who understands pacing and memes.", "url": "/r/youtubers/post_111" }
-      },
-      {
-        "post_id": "post_222",
-        "data": { "Title": "I am a video editor available for hire!", "post_text": "I can edit your videos, DM me for rates.", "url": "/r/forhire/post_222" }
-      }
-    ]
-    comments:
-
-    JSON
-
-    [
-      {
-        "comment_id": "comment_888",
-        "data": { "comment_text": "Ugh, I spend more time editing my TikToks than filming them. It's exhausting, I wish I could just hand the footage off to someone." }
-      },
-      {
-        "comment_id": "comment_999",
-        "data": { "comment_text": "Yeah, Adobe Premiere Pro is definitely the industry standard for a reason." }
-      }
-    ]
-    EXAMPLE OUTPUT (WHEN LEADS ARE FOUND):
+    EXAMPLE OUTPUT:
 
     JSON
 
@@ -104,42 +142,530 @@ def find_leads(user_query: str, posts_dict: list, posts_comments: list):
     }
     # STYLE / FORMAT (CRITICAL)
 
-    Your response format depends entirely on whether you find any leads.
-
-    1. IF you find one or more potential leads (from either posts or comments):
-
     You MUST respond ONLY with a single, valid JSON object.
 
     Do not include any introductory text, apologies, conversational filler, or explanations outside of the JSON structure.
 
     The root JSON object must contain two top-level keys: "post_leads" and "comment_leads".
 
-    If no leads are found for a specific category, you MUST return an empty array [] for that key.
+    If no leads are found for a specific category, you MUST return an empty array [] for that key. If no leads are found at all, return both keys with empty arrays.
 
-    2. IF you find ZERO potential leads (from both posts AND comments):
+    # RESTRICTIONS
 
-    You MUST NOT return a JSON object, an empty object, or any JSON formatting.
+    Do not create a description for any content that is not a clear lead.
 
-    Instead, you MUST respond ONLY with a helpful, plain text message. This message should acknowledge that no direct leads were found and provide actionable subreddit suggestions tailored to the user_query.
+    Base your analysis strictly on the provided user_query and the content arrays. Do not invent information or make assumptions beyond the text."""
+)
 
-    PLAIN TEXT OUTPUT EXAMPLE (WHEN NO LEADS ARE FOUND):
 
-    Based on your query for video editing, I couldn't find any direct leads in this batch. You might have better luck scanning more specific subreddits like r/youtubers, r/CreatorServices, or r/forhire where creators often look for editing help.
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for prompt budgeting, about 4 characters per token"""
+    return len(text) // CHARS_PER_TOKEN + 1
 
-    # RESTRICTIONS
 
-    Do not create a description for any content that is not a clear lead.
+def chunk_items(posts_dict: list, posts_comments: list, token_budget: int):
+    """
+    Split posts and comments into chunks whose prompts fit the token budget
 
-    Base your analysis strictly on the provided user_query and the content arrays. Do not invent information or make assumptions beyond the text."""
+    Args:
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+        token_budget (int): Estimated prompt tokens allowed per chunk
 
-    prompt = f"{system_prompt}\n\nUser request: {user_query}\n\nPosts data: {posts_dict}\n\nComments data: {posts_comments}"
-    
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=prompt,
+    Returns:
+        list: (posts, comments) tuples, every item appears in exactly one chunk
+    """
+    # The rules prompt is repeated in every call, only the rest is shared out
+    item_budget = max(1, token_budget - estimate_tokens(SYSTEM_PROMPT))
+
+    chunks = []
+    posts, comments, used = [], [], 0
+    items = [("post", post) for post in posts_dict] + [
+        ("comment", comment) for comment in posts_comments
+    ]
+    for kind, item in items:
+        cost = estimate_tokens(_compact_json(item)) + 1
+        # An oversized item still gets a chunk of its own
+        if used and used + cost > item_budget:
+            chunks.append((posts, comments))
+            posts, comments, used = [], [], 0
+        (posts if kind == "post" else comments).append(item)
+        used += cost
+
+    if posts or comments:
+        chunks.append((posts, comments))
+    return chunks
+
+
+TRIAGE_PROMPT = inspect.cleandoc(
+    """# ROLE
+
+    You are a fast lead triage assistant. You score Reddit posts and comments by how likely their author is a potential customer for the user's service (user_query).
+
+    # SCORING
+
+    For EVERY post and comment provided, return a confidence between 0.0 and 1.0:
+
+    1.0 means the author is clearly looking to hire or buy exactly what the user offers.
+
+    0.0 means the content is unrelated, is general discussion, or is someone offering a similar service themselves.
+
+    Use values in between when the need is implied, vague or only partly matches.
+
+    # FORMAT (CRITICAL)
+
+    Respond ONLY with a single valid JSON object, with no text outside of it:
+
+    {"scores": [{"id": "<post_id or comment_id>", "confidence": 0.0, "description": "<one sentence on why this is or is not a lead>"}]}"""
+)
+
+
+_LEAD_ENTRY_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "id": types.Schema(type=types.Type.STRING),
+        "description": types.Schema(type=types.Type.STRING),
+    },
+    required=["id", "description"],
+    property_ordering=["id", "description"],
+)
+
+# Schema-constrained output of LEAD_MODEL, streamed and parsed incrementally
+LEADS_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "post_leads": types.Schema(type=types.Type.ARRAY, items=_LEAD_ENTRY_SCHEMA),
+        "comment_leads": types.Schema(type=types.Type.ARRAY, items=_LEAD_ENTRY_SCHEMA),
+    },
+    required=["post_leads", "comment_leads"],
+    property_ordering=["post_leads", "comment_leads"],
+)
+
+# Schema-constrained output of TRIAGE_MODEL
+SCORES_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "scores": types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "id": types.Schema(type=types.Type.STRING),
+                    "confidence": types.Schema(type=types.Type.NUMBER),
+                    "description": types.Schema(type=types.Type.STRING),
+                },
+                required=["id", "confidence"],
+                property_ordering=["id", "confidence", "description"],
+            ),
+        ),
+    },
+    required=["scores"],
+)
+
+
+class TokenUsage:
+    """Prompt and response tokens spent by the AI calls of one find_leads run"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.calls = 0
+
+    def record(self, metadata, system_instruction: str, contents: str, text: str):
+        """Add a call, preferring the API's usage metadata over estimates"""
+        prompt_tokens = getattr(metadata, "prompt_token_count", None)
+        response_tokens = getattr(metadata, "candidates_token_count", None)
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(system_instruction) + estimate_tokens(contents)
+        if response_tokens is None:
+            response_tokens = estimate_tokens(text)
+        self.prompt_tokens += prompt_tokens
+        self.response_tokens += response_tokens
+        self.calls += 1
+
+    def as_dict(self):
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "calls": self.calls,
+        }
+
+
+def _compact_item(item: dict) -> dict:
+    """
+    Reduce an extracted item to what the AI needs: the id and the text
+
+    Subreddit, URL and timestamps are left out; the id is enough to map
+    verdicts back to the full item.
+    """
+    data = item["data"]
+    compact = {"i": item_id(item)}
+    if data.get("title"):
+        compact["t"] = data["title"]
+    text = data.get("post_text") or data.get("comment_text")
+    if text:
+        compact["x"] = text
+    return compact
+
+
+def _compact_json(item: dict) -> str:
+    return json.dumps(_compact_item(item), ensure_ascii=False, separators=(",", ":"))
+
+
+def serialize_items(user_query: str, posts_dict: list, posts_comments: list) -> str:
+    """
+    Build the per-call part of the prompt, one compact JSON object per line
+
+    Args:
+        user_query (str): Description of the user's service/product
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+
+    Returns:
+        str: Prompt contents; the static rules go in the system instruction
+    """
+    posts = "\n".join(_compact_json(post) for post in posts_dict)
+    comments = "\n".join(_compact_json(comment) for comment in posts_comments)
+    return (
+        f"User request: {user_query}\n\n"
+        f'Posts (one JSON object per line, "i" = id, "t" = title, "x" = text):\n{posts}\n\n'
+        f'Comments (one JSON object per line, "i" = id, "x" = text):\n{comments}'
+    )
+
+
+async def _generate(
+    model: str,
+    system_instruction: str,
+    contents: str,
+    usage: TokenUsage,
+    schema: types.Schema,
+    on_text=None,
+):
+    """
+    Run one AI call with the static rules as system instruction
+
+    The response is constrained to JSON matching the schema. With on_text
+    the response is streamed and every received piece of text is passed to
+    the callback as it arrives.
+
+    Returns:
+        str: Full response text
+    """
+    config = types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        response_mime_type="application/json",
+        response_schema=schema,
+    )
+
+    if on_text is None:
+        response = await get_client().aio.models.generate_content(
+            model=model, contents=contents, config=config
+        )
+        text = response.text or ""
+        usage.record(response.usage_metadata, system_instruction, contents, text)
+        return text
+
+    parts = []
+    metadata = None
+    stream = await get_client().aio.models.generate_content_stream(
+        model=model, contents=contents, config=config
+    )
+    async for chunk in stream:
+        # Usage metadata is complete on the last chunk
+        metadata = chunk.usage_metadata or metadata
+        if chunk.text:
+            parts.append(chunk.text)
+            await on_text(chunk.text)
+    text = "".join(parts)
+    usage.record(metadata, system_instruction, contents, text)
+    return text
+
+
+def _model_key(mode: str) -> str:
+    """Name of the model setup that produced a verdict, used in cache keys"""
+    if mode == "cascade":
+        return f"{TRIAGE_MODEL}>{LEAD_MODEL}"
+    return LEAD_MODEL
+
+
+async def _classify_chunk(
+    user_query: str,
+    posts_dict: list,
+    posts_comments: list,
+    usage: TokenUsage,
+    on_lead=None,
+):
+    """
+    Run a single streamed AI call over one chunk, with deadline, retries and
+    optional hedging
+
+    Leads are parsed from the stream as they complete and handed to
+    on_lead(key, lead) right away, key being "post_leads" or "comment_leads".
+
+    Returns:
+        dict: Parsed AI output with "post_leads" and "comment_leads"
+
+    Raises:
+        Exception: If the AI API call still fails after retries
+    """
+    contents = serialize_items(user_query, posts_dict, posts_comments)
+    # Retries and hedged duplicates may repeat leads that were already handed out
+    emitted = set()
+
+    async def attempt():
+        parser = LeadStreamParser()
+
+        async def on_text(text):
+            for key, lead in parser.feed(text):
+                if on_lead is not None and (key, lead["id"]) not in emitted:
+                    emitted.add((key, lead["id"]))
+                    await on_lead(key, lead)
+
+        text = await _generate(
+            LEAD_MODEL, SYSTEM_PROMPT, contents, usage, LEADS_SCHEMA, on_text
         )
-        return response.text
+        if not parser.started:
+            # The model ignored the JSON mode, fall back to the lenient parser
+            return parse_ai_output(text)
+        return parser.result
+
+    return await call_with_resilience(attempt, LEAD_MODEL)
+
+
+async def _triage_chunk(
+    user_query: str, posts_dict: list, posts_comments: list, usage: TokenUsage
+):
+    """
+    Score every item of a chunk with the fast triage model
+
+    Returns:
+        dict: Item id -> (confidence, description)
+
+    Raises:
+        Exception: If the AI API call still fails after retries
+    """
+    contents = serialize_items(user_query, posts_dict, posts_comments)
+    text = await call_with_resilience(
+        lambda: _generate(TRIAGE_MODEL, TRIAGE_PROMPT, contents, usage, SCORES_SCHEMA),
+        TRIAGE_MODEL,
+    )
+    scores = {}
+    for score in parse_ai_output(text).get("scores") or []:
+        try:
+            scores[str(score["id"])] = (
+                float(score["confidence"]),
+                score.get("description"),
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+    return scores
+
+
+async def _classify_chunk_cascade(
+    user_query: str,
+    posts_dict: list,
+    posts_comments: list,
+    usage: TokenUsage,
+    on_lead=None,
+):
+    """
+    Classify a chunk with the fast model and escalate only ambiguous items
+
+    Items scored at or above the accept threshold are leads, items at or
+    below the reject threshold are not, and everything in between (or not
+    scored at all) goes to LEAD_MODEL.
+
+    Returns:
+        dict: AI output with "post_leads" and "comment_leads", in the same
+        shape as _classify_chunk
+
+    Raises:
+        Exception: If the escalation call fails
+    """
+    try:
+        scores = await _triage_chunk(user_query, posts_dict, posts_comments, usage)
     except Exception as e:
-        print(f"Error calling AI API: {e}")
-        return "No leads found due to API error."
+        print(f"Triage failed, escalating whole chunk: {e}")
+        scores = {}
+
+    result = {"post_leads": [], "comment_leads": []}
+    escalate_posts, escalate_comments = [], []
+    for key, items, escalate in (
+        ("post_leads", posts_dict, escalate_posts),
+        ("comment_leads", posts_comments, escalate_comments),
+    ):
+        for item in items:
+            confidence, description = scores.get(item_id(item), (None, None))
+            if confidence is None or (
+                CASCADE_REJECT_THRESHOLD < confidence < CASCADE_ACCEPT_THRESHOLD
+            ):
+                escalate.append(item)
+            elif confidence >= CASCADE_ACCEPT_THRESHOLD:
+                lead = {"id": item_id(item), "description": description}
+                result[key].append(lead)
+                if on_lead is not None:
+                    await on_lead(key, lead)
+
+    if escalate_posts or escalate_comments:
+        print(
+            f"Escalating {len(escalate_posts)} posts and "
+            f"{len(escalate_comments)} comments to {LEAD_MODEL}"
+        )
+        escalated = await _classify_chunk(
+            user_query, escalate_posts, escalate_comments, usage, on_lead
+        )
+        result["post_leads"].extend(escalated.get("post_leads") or [])
+        result["comment_leads"].extend(escalated.get("comment_leads") or [])
+
+    return result
+
+
+async def find_leads(
+    user_query: str,
+    posts_dict: list,
+    posts_comments: list,
+    token_budget: int = None,
+    max_concurrency: int = None,
+    mode: str = None,
+    on_lead=None,
+):
+    """
+    Find potential leads using AI analysis of Reddit posts and comments.
+
+    Verdicts already in the classification cache are reused; only cache
+    misses are sent to the model. Those are split into chunks sized by an
+    estimated token budget and classified concurrently through the async
+    Gemini client, so the event loop stays free while calls are in flight.
+    A failed chunk only loses the leads of that chunk. In cascade mode each
+    chunk is triaged by TRIAGE_MODEL and only ambiguous items reach LEAD_MODEL.
+
+    Args:
+        user_query (str): Description of the user's service/product
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+        token_budget (int): Estimated prompt tokens per call,
+            defaults to LEAD_CHUNK_TOKEN_BUDGET
+        max_concurrency (int): Maximum number of concurrent calls,
+            defaults to LEAD_MAX_CONCURRENT_CALLS
+        mode (str): "single" or "cascade", defaults to LEAD_CLASSIFIER_MODE
+        on_lead: Optional async callback on_lead(key, lead) invoked for every
+            lead as soon as it is known, key being "post_leads" or
+            "comment_leads", so leads can be stored before the calls finish
+
+    Returns:
+        dict: Merged "post_leads" and "comment_leads" of all chunks, plus
+        "failed_chunks" with the number of chunks whose call failed and
+        "cached_items" with the number of items answered from the cache and
+        "usage" with the prompt/response tokens spent
+
+    Raises:
+        LeadFinderError: If every AI call failed and no item was answered
+        from the cache, so nothing at all was classified
+    """
+    result = {
+        "post_leads": [],
+        "comment_leads": [],
+        "failed_chunks": 0,
+        "cached_items": 0,
+        "usage": TokenUsage().as_dict(),
+    }
+
+    mode = mode or CLASSIFIER_MODE
+    if mode not in ("single", "cascade"):
+        raise ValueError(f"Unknown classifier mode '{mode}'")
+    model_key = _model_key(mode)
+    classify_chunk = _classify_chunk_cascade if mode == "cascade" else _classify_chunk
+
+    # Serve what we can from the cache
+    keys = {
+        (item_kind(item), item_id(item)): classification_cache.cache_key(
+            item, user_query, model_key
+        )
+        for item in posts_dict + posts_comments
+    }
+    cached = await classification_cache.lookup(list(keys.values()))
+    for key, items in (("post_leads", posts_dict), ("comment_leads", posts_comments)):
+        for item in items:
+            verdict = cached.get(keys[item_kind(item), item_id(item)])
+            if verdict is None:
+                continue
+            result["cached_items"] += 1
+            is_lead, description = verdict
+            if is_lead:
+                lead = {"id": item_id(item), "description": description}
+                result[key].append(lead)
+                if on_lead is not None:
+                    await on_lead(key, lead)
+
+    def is_miss(item):
+        return keys[item_kind(item), item_id(item)] not in cached
+
+    posts_dict = [post for post in posts_dict if is_miss(post)]
+    posts_comments = [comment for comment in posts_comments if is_miss(comment)]
+    chunks = chunk_items(posts_dict, posts_comments, token_budget or CHUNK_TOKEN_BUDGET)
+    if not chunks:
+        return result
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or MAX_CONCURRENT_CALLS))
+    usage = TokenUsage()
+
+    errors = []
+
+    async def classify(chunk):
+        async with semaphore:
+            try:
+                return await classify_chunk(user_query, *chunk, usage, on_lead)
+            except Exception as e:
+                print(f"Error calling AI API: {e}")
+                errors.append(e)
+                return None
+
+    verdicts = []
+    outputs = await asyncio.gather(*(classify(chunk) for chunk in chunks))
+    for (chunk_posts, chunk_comments), ai_data in zip(chunks, outputs):
+        if ai_data is None:
+            # Nothing is cached for a failed chunk, it is retried next run
+            result["failed_chunks"] += 1
+            continue
+        post_leads = ai_data.get("post_leads") or []
+        comment_leads = ai_data.get("comment_leads") or []
+        result["post_leads"].extend(post_leads)
+        result["comment_leads"].extend(comment_leads)
+
+        descriptions = {
+            lead["id"]: lead.get("description")
+            for lead in post_leads + comment_leads
+            if "id" in lead
+        }
+        for item in chunk_posts + chunk_comments:
+            verdicts.append(
+                {
+                    "cache_key": keys[item_kind(item), item_id(item)],
+                    "item_id": item_id(item),
+                    "model": model_key,
+                    "is_lead": item_id(item) in descriptions,
+                    "description": descriptions.get(item_id(item)),
+                }
+            )
+
+    await classification_cache.store(verdicts)
+    result["usage"] = usage.as_dict()
+
+    # A run where nothing was classified is an error, not a run without leads
+    if result["failed_chunks"] == len(chunks) and not result["cached_items"]:
+        raise LeadFinderError(
+            f"All {len(chunks)} AI calls failed, last error: {errors[-1]}",
+            failed_calls=len(chunks),
+        )
+
+    print(
+        f"Classified {len(chunks)} chunks, {result['failed_chunks']} failed, "
+        f"{result['cached_items']} items from cache, "
+        f"{len(result['post_leads'])} post leads, {len(result['comment_leads'])} comment leads"
+    )
+    classified = sum(len(posts) + len(comments) for posts, comments in chunks)
+    print(
+        f"Used {usage.prompt_tokens} prompt and {usage.response_tokens} response tokens "
+        f"in {usage.calls} calls, {usage.prompt_tokens / classified:.0f} prompt tokens per item"
+    )
+    return result
@@ -1,16 +1,30 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 import asyncio
 from db import (
+    init_db,
+    close_db,
     get_scanned_subreddits,
     save_scanned_subreddit,
     get_leads as db_get_leads,
+    count_leads,
+    search_leads,
+    iter_leads,
+    get_stats,
+    LEAD_SOURCES,
+    get_keywords as db_get_keywords,
+    save_keyword,
+    delete_keyword,
 )
 from controller import LeadlyController
+from seen_index import seen_index
+from leadFinderAi import close_client
+from export import export_chunks, EXPORT_FORMATS
 from job_tracker import create_job, get_job, JobStatus
 from scheduler import run_scheduled_job
 from task_manager import task_manager
@@ -30,9 +44,20 @@ scheduler_task = None
 @app.on_event("startup")
 async def startup_event():
     """Initialize any background tasks on startup"""
+    # Create missing tables once, instead of on every query
+    await init_db()
+    await asyncio.to_thread(seen_index.load)
     print("Leadly API started successfully")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist the seen index, close the Gemini client and the database pool"""
+    await asyncio.to_thread(seen_index.flush)
+    await close_client()
+    await close_db()
+
+
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
     CORSMiddleware,
@@ -54,11 +79,16 @@ class HealthResponse(BaseModel):
 
 class LeadResponse(BaseModel):
     id: int
+    # "post" or "comment"; ids are only unique within one source
+    source: str = "post"
     post_id: str
-    title: str
+    comment_id: Optional[str] = None
+    title: Optional[str]
     post_text: Optional[str]
     url: str
-    subreddit_name: str
+    subreddit_name: Optional[str]
+    description: Optional[str] = None
+    score: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -66,8 +96,26 @@ class LeadResponse(BaseModel):
 class LeadsResponse(BaseModel):
     leads: List[LeadResponse]
     total: int
+    # True when total is the planner's row estimate instead of an exact count
+    total_is_estimate: bool = False
     limit: int
     offset: int
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+
+class LeadSearchResult(LeadResponse):
+    rank: float
+    # Matching text with the matched words wrapped in <mark>...</mark>
+    headline: Optional[str] = None
+
+
+class LeadSearchResponse(BaseModel):
+    leads: List[LeadSearchResult]
+    query: str
+    limit: int
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: Optional[str] = None
 
 
 class DeleteResponse(BaseModel):
@@ -88,6 +136,8 @@ class SearchRequest(BaseModel):
     limit_per_subreddit: int = 10
     keywords: List[str] = []
     user_query: str = ""
+    # Optional profile name -> service description, classified over one extraction
+    profiles: Dict[str, str] = {}
 
 
 class SearchResponse(BaseModel):
@@ -203,6 +253,24 @@ async def health_check():
     return HealthResponse(status="ok", timestamp=datetime.utcnow())
 
 
+def _lead_fields(lead) -> dict:
+    """LeadResponse fields of a row returned by db.get_leads or db.search_leads"""
+    return dict(
+        id=lead.id,
+        source=lead.source,
+        post_id=lead.post_id or lead.item_id,
+        comment_id=lead.item_id if lead.source == "comment" else None,
+        title=lead.title,
+        post_text=lead.text,
+        url=lead.url or "",
+        subreddit_name=lead.subreddit_name,
+        description=lead.description,
+        score=lead.score,
+        created_at=lead.created_at,
+        updated_at=lead.updated_at,
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -210,32 +278,119 @@ if __name__ == "__main__":
 async def get_leads(
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     subreddit: Optional[str] = None,
     source: Optional[str] = None,
     min_score: Optional[int] = None,
     api_key: str = Depends(verify_api_key),
 ):
-    """Retrieve all leads from the database."""
+    """Retrieve leads, newest first, one page at a time."""
+    if source is not None and source not in LEAD_SOURCES:
+        raise HTTPException(
+            status_code=400, detail=f"source must be one of {', '.join(LEAD_SOURCES)}"
+        )
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+
     # Fetch leads from database
-    leads = await db_get_leads(limit=limit, offset=offset)
+    try:
+        leads, next_cursor = await db_get_leads(
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            subreddit=subreddit,
+            source=source,
+            min_score=min_score,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total, total_is_estimate = await count_leads(
+        subreddit=subreddit, source=source, min_score=min_score
+    )
 
     # Convert to response format
-    lead_responses = [
-        LeadResponse(
-            id=lead.id,
-            post_id=lead.post_id,
-            title=lead.title,
-            post_text=lead.post_text,
-            url=lead.url,
-            subreddit_name=lead.subreddit_name,
-            created_at=lead.created_at,
-            updated_at=lead.updated_at,
-        )
-        for lead in leads
-    ]
+    lead_responses = [LeadResponse(**_lead_fields(lead)) for lead in leads]
 
     return LeadsResponse(
-        leads=lead_responses, total=len(lead_responses), limit=limit, offset=offset
+        leads=lead_responses,
+        total=total,
+        total_is_estimate=total_is_estimate,
+        limit=limit,
+        offset=offset,
+        next_cursor=next_cursor,
+    )
+
+
+# Search leads
+@app.get("/api/v1/leads/search", response_model=LeadSearchResponse)
+async def search_leads_endpoint(
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    subreddit: Optional[str] = None,
+    source: Optional[str] = None,
+    min_score: Optional[int] = None,
+    api_key: str = Depends(verify_api_key),
+):
+    """Full-text search over stored leads, best matches first."""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query is required")
+    if source is not None and source not in LEAD_SOURCES:
+        raise HTTPException(
+            status_code=400, detail=f"source must be one of {', '.join(LEAD_SOURCES)}"
+        )
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+
+    try:
+        leads, next_cursor = await search_leads(
+            q,
+            limit=limit,
+            cursor=cursor,
+            subreddit=subreddit,
+            source=source,
+            min_score=min_score,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return LeadSearchResponse(
+        leads=[
+            LeadSearchResult(
+                **_lead_fields(lead), rank=lead.rank, headline=lead.headline
+            )
+            for lead in leads
+        ],
+        query=q,
+        limit=limit,
+        next_cursor=next_cursor,
+    )
+
+
+# Export leads
+@app.get("/api/v1/leads/export")
+async def export_leads(
+    format: str = "ndjson",
+    subreddit: Optional[str] = None,
+    source: Optional[str] = None,
+    min_score: Optional[int] = None,
+    api_key: str = Depends(verify_api_key),
+):
+    """Stream all matching leads as NDJSON or CSV."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}"
+        )
+    if source is not None and source not in LEAD_SOURCES:
+        raise HTTPException(
+            status_code=400, detail=f"source must be one of {', '.join(LEAD_SOURCES)}"
+        )
+
+    rows = iter_leads(subreddit=subreddit, source=source, min_score=min_score)
+    return StreamingResponse(
+        export_chunks(rows, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="leads.{format}"'},
     )
 
 
@@ -282,7 +437,7 @@ async def manual_lead_search(
                 status_code=400, detail="At least one subreddit is required"
             )
 
-        if not request.user_query.strip():
+        if not request.user_query.strip() and not request.profiles:
             raise HTTPException(status_code=400, detail="User query is required")
 
         # Create a job for tracking
@@ -292,7 +447,11 @@ async def manual_lead_search(
         # Run the lead finder in the background with job tracking
         task = asyncio.create_task(
             run_lead_finder_with_error_handling(
-                request.user_query, request.subreddits, job.job_id
+                request.user_query,
+                request.subreddits,
+                job.job_id,
+                request.keywords,
+                request.profiles,
             )
         )
         print(f"Created task {task} for job {job.job_id}")
@@ -319,16 +478,32 @@ async def manual_lead_search(
 
 
 async def run_lead_finder_with_error_handling(
-    user_query: str, subreddits: List[str], job_id: str
+    user_query: str,
+    subreddits: List[str],
+    job_id: str,
+    keywords: List[str] = None,
+    profiles: Dict[str, str] = None,
 ):
     """Wrapper function to run lead finder with proper error handling"""
     print(f"Starting run_lead_finder_with_error_handling for job {job_id}")
     try:
-        await controller.run_lead_finder(
-            user_query=user_query,
-            subreddits=subreddits,
-            job_id=job_id,
-        )
+        if profiles:
+            # One Reddit extraction shared by every profile
+            if user_query.strip():
+                profiles = {**profiles, "default": user_query}
+            await controller.run_profiles(
+                profiles=profiles,
+                subreddits=subreddits,
+                job_id=job_id,
+                keywords=keywords,
+            )
+        else:
+            await controller.run_lead_finder(
+                user_query=user_query,
+                subreddits=subreddits,
+                job_id=job_id,
+                keywords=keywords,
+            )
         print(f"Completed run_lead_finder_with_error_handling for job {job_id}")
     except Exception as e:
         print(f"Lead finder failed for job {job_id}: {str(e)}")
@@ -395,8 +570,8 @@ async def remove_subreddit(subreddit: str, api_key: str = Depends(verify_api_key
 @app.get("/api/v1/config/keywords", response_model=KeywordsResponse)
 async def get_keywords(api_key: str = Depends(verify_api_key)):
     """Get the list of keywords to search for."""
-    # This is a simplified implementation
-    return KeywordsResponse(keywords=[])
+    keywords = await db_get_keywords()
+    return KeywordsResponse(keywords=keywords)
 
 
 # Add keyword
@@ -405,7 +580,10 @@ async def add_keyword(
     request: AddKeywordRequest, api_key: str = Depends(verify_api_key)
 ):
     """Add a keyword to search for."""
-    # This is a simplified implementation
+    keyword = request.keyword.strip()
+    if not keyword:
+        raise HTTPException(status_code=400, detail="Keyword is required")
+    await save_keyword(keyword)
     return AddKeywordResponse(message="Keyword added successfully")
 
 
@@ -413,7 +591,7 @@ async def add_keyword(
 @app.delete("/api/v1/config/keywords/{keyword}", response_model=AddKeywordResponse)
 async def remove_keyword(keyword: str, api_key: str = Depends(verify_api_key)):
     """Remove a keyword from the search list."""
-    # This is a simplified implementation
+    await delete_keyword(keyword)
     return AddKeywordResponse(message="Keyword removed successfully")
 
 
@@ -459,14 +637,10 @@ async def run_scheduled_job_wrapper():
 @app.get("/api/v1/stats", response_model=StatsResponse)
 async def get_system_stats(api_key: str = Depends(verify_api_key)):
     """Get system statistics and metrics."""
-    # This is a simplified implementation
-    return StatsResponse(
-        total_leads=0,
-        leads_by_subreddit={},
-        leads_by_source={"post": 0, "comment": 0},
-        last_scan=None,
-        database_size="0 MB",
-    )
+    try:
+        return StatsResponse(**await get_stats())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
 
 if __name__ == "__main__":
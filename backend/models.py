@@ -1,6 +1,20 @@
-from sqlalchemy import String, Boolean, TEXT, Column, DateTime
+from sqlalchemy import String, Boolean, TEXT, Column, Date, DateTime, Float, Integer, Index, UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from datetime import datetime
+from datetime import date, datetime
+
+# Text search configuration of the generated search_vector columns
+SEARCH_CONFIG = "english"
+# Title matches rank above body matches, which rank above the AI description
+LEAD_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(post_text, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')"
+)
+COMMENT_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')"
+)
 
 class Base(DeclarativeBase):
     pass
@@ -26,8 +40,56 @@ class SubredditToScan(Base):
     def __repr__(self):
         return f"<Subreddit name='{self.name}' active={self.is_active}>"
 
+class SubredditCursor(Base):
+    __tablename__ = "subreddit_cursors"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(
+        String(100),
+        unique=True,
+        index=True,
+        doc="Name of the subreddit this high-water mark belongs to",
+    )
+    last_post_fullname: Mapped[str | None] = mapped_column(
+        String(20),
+        doc="Fullname (t3_...) of the newest post seen, e.g. 't3_1nak9eg'",
+    )
+    last_post_created_utc: Mapped[float | None] = mapped_column(
+        Float,
+        doc="created_utc of the newest post seen; older posts are skipped",
+    )
+    last_comment_created_utc: Mapped[float | None] = mapped_column(
+        Float,
+        doc="created_utc of the newest comment seen; older comments are skipped",
+    )
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SubredditCursor name='{self.name}' last_post='{self.last_post_fullname}'>"
+
+class Keyword(Base):
+    __tablename__ = "keywords"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    keyword: Mapped[str] = mapped_column(
+        String(100),
+        unique=True,
+        index=True,
+        doc="Keyword that always lets matching content through the prefilter",
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Keyword keyword='{self.keyword}'>"
+
 class Lead(Base):
     __tablename__ = "leads"
+    __table_args__ = (
+        # Keyset pagination, newest first, optionally within one subreddit
+        Index("ix_leads_created_at_id", "created_at", "id"),
+        Index("ix_leads_subreddit_created_at_id", "subreddit_name", "created_at", "id"),
+        Index("ix_leads_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     post_id: Mapped[str] = mapped_column(String(20), unique=True, index=True)
@@ -35,20 +97,160 @@ class Lead(Base):
     post_text: Mapped[str | None] = mapped_column(TEXT)
     url: Mapped[str] = mapped_column(String(500))
     subreddit_name: Mapped[str] = mapped_column(String(100), index=True)
+    description: Mapped[str | None] = mapped_column(
+        TEXT,
+        doc="Why the AI considers this post a lead",
+    )
+    score: Mapped[int | None] = mapped_column(
+        Integer,
+        doc="Reddit score (upvotes minus downvotes) when the post was extracted",
+    )
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(LEAD_SEARCH_VECTOR, persisted=True),
+        doc="Full-text search document, maintained by Postgres",
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Lead post_id='{self.post_id}' title='{self.title[:30]}...'>"
 
+class LeadProfile(Base):
+    __tablename__ = "lead_profiles"
+    __table_args__ = (
+        UniqueConstraint("item_id", "profile", name="uq_lead_profiles_item_profile"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    item_id: Mapped[str] = mapped_column(
+        String(20),
+        index=True,
+        doc="post_id or comment_id of the lead",
+    )
+    profile: Mapped[str] = mapped_column(
+        String(100),
+        index=True,
+        doc="Name of the service profile the content is a lead for",
+    )
+    description: Mapped[str | None] = mapped_column(TEXT)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<LeadProfile item_id='{self.item_id}' profile='{self.profile}'>"
+
 class Comment(Base):  # New model for comments as leads
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_created_at_id", "created_at", "id"),
+        Index(
+            "ix_comments_subreddit_created_at_id", "subreddit_name", "created_at", "id"
+        ),
+        Index("ix_comments_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     comment_id: Mapped[str] = mapped_column(String(20), unique=True, index=True)
     text: Mapped[str] = mapped_column(TEXT)
+    description: Mapped[str | None] = mapped_column(
+        TEXT,
+        doc="Why the AI considers this comment a lead",
+    )
+    subreddit_name: Mapped[str | None] = mapped_column(String(100), index=True)
+    post_id: Mapped[str | None] = mapped_column(
+        String(20),
+        doc="Id of the post the comment was made on",
+    )
+    url: Mapped[str | None] = mapped_column(String(500))
+    score: Mapped[int | None] = mapped_column(
+        Integer,
+        doc="Reddit score of the comment when it was extracted",
+    )
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(COMMENT_SEARCH_VECTOR, persisted=True),
+        doc="Full-text search document, maintained by Postgres",
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f"<Comment comment_id='{self.comment_id}' text='{self.text[:30]}...'>"
+
+class ClassificationCacheEntry(Base):
+    __tablename__ = "classification_cache"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    cache_key: Mapped[str] = mapped_column(
+        String(64),
+        unique=True,
+        index=True,
+        doc="sha256 of (item id, content hash, user_query hash, model)",
+    )
+    item_id: Mapped[str] = mapped_column(String(20), index=True)
+    model: Mapped[str] = mapped_column(String(100))
+    is_lead: Mapped[bool] = mapped_column(Boolean)
+    description: Mapped[str | None] = mapped_column(TEXT)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ClassificationCacheEntry item_id='{self.item_id}' is_lead={self.is_lead}>"
+
+class SeenItem(Base):
+    __tablename__ = "seen_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    item_id: Mapped[str] = mapped_column(
+        String(20),
+        unique=True,
+        index=True,
+        doc="post_id or comment_id processed by a scheduled run",
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<SeenItem item_id='{self.item_id}'>"
+
+class LeadStat(Base):
+    __tablename__ = "lead_stats"
+
+    subreddit_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    source: Mapped[str] = mapped_column(
+        String(20),
+        primary_key=True,
+        doc="'post' or 'comment'",
+    )
+    day: Mapped[date] = mapped_column(
+        Date,
+        primary_key=True,
+        doc="UTC day the leads were stored on",
+    )
+    count: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        doc="Leads inserted, incremented in the same transaction as the inserts",
+    )
+
+    def __repr__(self):
+        return f"<LeadStat subreddit='{self.subreddit_name}' source='{self.source}' day={self.day} count={self.count}>"
+
+class ScanHistory(Base):
+    __tablename__ = "scan_history"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    status: Mapped[str] = mapped_column(
+        String(20),
+        doc="'completed' or 'failed'",
+    )
+    subreddits: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        doc="Number of subreddits scanned, 0 for the default list",
+    )
+    items_extracted: Mapped[int] = mapped_column(Integer, default=0)
+    leads_found: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self):
+        return f"<ScanHistory finished_at={self.finished_at} status='{self.status}'>"
@@ -0,0 +1,171 @@
+import os
+import re
+import numpy as np
+from dotenv import load_dotenv
+from reddit_data_extractor import item_kind
+
+load_dotenv()
+
+# Set to "1" to drop low-relevance items before the AI. Off by default: the
+# BM25 threshold is not calibrated yet and drops real leads worded unlike the query
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "0") == "1"
+# Minimum BM25 relevance against user_query (and keywords) to reach the AI
+PREFILTER_MIN_SCORE = float(os.getenv("PREFILTER_MIN_SCORE", "1.0"))
+# Items matching this regex never reach the AI, e.g. "[For Hire]" self-promotion
+PREFILTER_EXCLUDE_REGEX = os.getenv(
+    "PREFILTER_EXCLUDE_REGEX",
+    r"\[\s*for\s*hire\s*\]|\[\s*offer\s*\]|\bhire me\b",
+)
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+SUFFIXES = ("ments", "ment", "ings", "ing", "ers", "er", "ed", "s")
+STOPWORDS = frozenset(
+    """a about above after again all am an and any are as at be because been
+    before being below between both but by can could did do does doing down
+    during each few for from further had has have having he her here hers him
+    his how i if in into is it its itself just me more most my myself no nor
+    not now of off on once only or other our ours out over own same she should
+    so some such than that the their theirs them then there these they this
+    those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours""".split()
+)
+
+
+def _stem(token: str) -> str:
+    """Strip one common English suffix so "designer" and "designs" meet "design" """
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[: -len(suffix)]
+            break
+    if token.endswith("e") and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Lowercase, split into word tokens, drop stopwords and stem"""
+    return [
+        _stem(token)
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def item_text(item: dict) -> str:
+    """Text of a post (title and body) or comment used for matching"""
+    data = item["data"]
+    return " ".join(
+        part
+        for part in (data.get("title"), data.get("post_text"), data.get("comment_text"))
+        if part
+    )
+
+
+def bm25_scores(query: str, documents: list) -> np.ndarray:
+    """
+    Score documents against a query with BM25
+
+    Only query terms matter for BM25, so the term-frequency matrix is
+    documents x query terms, filled from (row, column) pairs like a COO
+    sparse matrix and scored in one vectorized pass.
+
+    Args:
+        query (str): Text to score against
+        documents (list): Document texts
+
+    Returns:
+        np.ndarray: One score per document
+    """
+    terms = {term: col for col, term in enumerate(dict.fromkeys(tokenize(query)))}
+    if not documents or not terms:
+        return np.zeros(len(documents))
+
+    rows, cols, lengths = [], [], []
+    for row, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths.append(len(tokens))
+        for token in tokens:
+            col = terms.get(token)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+
+    tf = np.zeros((len(documents), len(terms)), dtype=np.float64)
+    np.add.at(tf, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1.0)
+
+    n_docs = len(documents)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+    doc_len = np.array(lengths, dtype=np.float64)
+    avg_len = doc_len.mean() or 1.0
+    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len / avg_len)
+    return (tf * (BM25_K1 + 1.0) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def prefilter_items(
+    user_query: str,
+    posts_dict: list,
+    posts_comments: list,
+    keywords=None,
+    min_score: float = None,
+):
+    """
+    Drop obvious noise before it reaches the AI
+
+    An item is excluded if it matches PREFILTER_EXCLUDE_REGEX. Otherwise it is
+    kept if it contains one of the keywords or its BM25 score against the
+    user_query plus keywords reaches the threshold.
+
+    Args:
+        user_query (str): The user's service description
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+        keywords (list): Optional keywords that always let an item through
+        min_score (float): BM25 threshold, defaults to PREFILTER_MIN_SCORE
+
+    Returns:
+        tuple: (posts, comments) that should be classified by the AI
+    """
+    if not PREFILTER_ENABLED:
+        return posts_dict, posts_comments
+
+    items = posts_dict + posts_comments
+    if not items:
+        return posts_dict, posts_comments
+
+    keywords = [keyword.strip() for keyword in keywords or [] if keyword.strip()]
+    min_score = PREFILTER_MIN_SCORE if min_score is None else min_score
+    texts = [item_text(item) for item in items]
+
+    exclude = re.compile(PREFILTER_EXCLUDE_REGEX, re.IGNORECASE)
+    excluded = np.array([bool(exclude.search(text)) for text in texts])
+
+    if keywords:
+        # Lookarounds rather than \b, so keywords like "c++" or ".net" match
+        keyword_pattern = re.compile(
+            r"(?<!\w)(?:"
+            + "|".join(re.escape(keyword) for keyword in keywords)
+            + r")(?!\w)",
+            re.IGNORECASE,
+        )
+        keyword_hit = np.array([bool(keyword_pattern.search(text)) for text in texts])
+    else:
+        keyword_hit = np.zeros(len(items), dtype=bool)
+
+    scores = bm25_scores(" ".join([user_query, *keywords]), texts)
+    keep = ~excluded & (keyword_hit | (scores >= min_score))
+
+    kept_posts = [item for item, ok in zip(items, keep) if ok and item_kind(item) == "post"]
+    kept_comments = [
+        item for item, ok in zip(items, keep) if ok and item_kind(item) == "comment"
+    ]
+    print(
+        f"Prefilter kept {len(kept_posts)}/{len(posts_dict)} posts and "
+        f"{len(kept_comments)}/{len(posts_comments)} comments"
+    )
+    return kept_posts, kept_comments
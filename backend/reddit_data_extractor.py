@@ -1,74 +1,587 @@
+import asyncio
+import hashlib
+import json
 import asyncpraw
 import textwrap
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Maximum number of subreddits extracted at the same time over the shared session
+MAX_CONCURRENT_SUBREDDITS = int(os.getenv("REDDIT_MAX_CONCURRENT_SUBREDDITS", "5"))
+# Maximum number of comment trees being fetched at the same time
+MAX_CONCURRENT_COMMENT_FETCHES = int(os.getenv("REDDIT_MAX_CONCURRENT_COMMENTS", "10"))
+# Seconds to wait for a single post's comment tree before giving up on it
+COMMENT_FETCH_TIMEOUT = float(os.getenv("REDDIT_COMMENT_TIMEOUT", "15"))
 
-async def get_reddit_data(subreddits=None):
-    reddit_read_only = asyncpraw.Reddit(
+# Comment ingestion modes:
+#   "submission" opens the newest posts and reads their comment trees
+#   "listing" pages through the subreddit's newest-comments listing
+COMMENT_MODE_SUBMISSION = "submission"
+COMMENT_MODE_LISTING = "listing"
+COMMENT_MODES = (COMMENT_MODE_SUBMISSION, COMMENT_MODE_LISTING)
+DEFAULT_COMMENT_MODE = os.getenv("REDDIT_COMMENT_MODE", COMMENT_MODE_SUBMISSION)
+# Maximum number of comments read from the listing per subreddit (100 per page)
+COMMENT_LISTING_LIMIT = int(os.getenv("REDDIT_COMMENT_LISTING_LIMIT", "300"))
+# Number of newest posts read on a full scan
+POST_LIMIT = int(os.getenv("REDDIT_POST_LIMIT", "20"))
+# Upper bound of posts read on an incremental scan; new posts stop at the cursor,
+# but the comment trees of the POST_LIMIT newest posts are always read again
+INCREMENTAL_POST_LIMIT = int(os.getenv("REDDIT_INCREMENTAL_POST_LIMIT", "100"))
+# Posts in the seen index older than this many hours no longer have their
+# comment trees read; most comments arrive while a post is young
+SEEN_TREE_HOURS = float(os.getenv("REDDIT_SEEN_TREE_HOURS", "24"))
+# Posts plus comments per batch yielded by stream_reddit_data
+BATCH_SIZE = int(os.getenv("REDDIT_BATCH_SIZE", "50"))
+# Batches worth of fetched items buffered before fetchers wait for the consumer
+QUEUE_BATCHES = int(os.getenv("REDDIT_QUEUE_BATCHES", "2"))
+
+REDDIT_URL = "https://www.reddit.com"
+
+
+def item_source(item):
+    """
+    Full metadata of an extracted item, for storing it as a lead
+
+    "data" only holds the shortened text sent to the AI; "source" keeps the
+    full text, the post title and the permalink so leads can be saved
+    without looking them up on Reddit again.
+
+    Returns:
+        dict: kind, id, post_id, subreddit, title, text, url and Reddit score
+        of the item
+    """
+    source = item.get("source") or {}
+    return {
+        "kind": item_kind(item),
+        "id": item_id(item),
+        "post_id": item["post_id"],
+        "subreddit": item.get("subreddit"),
+        "title": source.get("title") or item["data"].get("title"),
+        "text": source.get("text")
+        or item["data"].get("post_text")
+        or item["data"].get("comment_text"),
+        "url": source.get("url") or f"{REDDIT_URL}/comments/{item['post_id']}",
+        "score": source.get("score"),
+    }
+
+
+def item_id(item):
+    """Return the Reddit id of a post or comment dict"""
+    # Comments also carry their parent "post_id", so check "comment_id" first
+    return item.get("comment_id") or item["post_id"]
+
+
+def item_kind(item):
+    """Return "comment" or "post" for an extracted item"""
+    return "comment" if "comment_id" in item else "post"
+
+
+def content_hash(item):
+    """Hash of the content sent to the AI, changes when the text is edited"""
+    return hashlib.sha256(
+        json.dumps(item["data"], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _comment_item(comment, subreddit_name, post_id, post_title=None):
+    """Build the comment dict passed on to the AI from an asyncpraw comment"""
+    return {
+        "comment_id": comment.id,
+        "post_id": post_id,
+        "created_utc": comment.created_utc,
+        "data": {
+            "comment_text": textwrap.shorten(
+                comment.body, width=200, placeholder="..."
+            ),
+        },
+        "subreddit": subreddit_name,
+        "source": {
+            "title": post_title,
+            "text": comment.body,
+            "url": f"{REDDIT_URL}{comment.permalink}",
+            "score": comment.score,
+        },
+    }
+
+
+def advance_cursors(cursors, posts_dict, posts_comments):
+    """
+    Move each subreddit's high-water mark past the newest extracted content
+
+    Args:
+        cursors (dict): Subreddit name -> cursor dict used for the scan
+        posts_dict (list): Posts returned by get_reddit_data
+        posts_comments (list): Comments returned by get_reddit_data
+
+    Returns:
+        dict: Subreddit name -> updated cursor dict, only for subreddits that
+        produced new content
+    """
+    advanced = {}
+
+    def cursor_for(subreddit_name):
+        if subreddit_name not in advanced:
+            advanced[subreddit_name] = {
+                "last_post_fullname": None,
+                "last_post_created_utc": None,
+                "last_comment_created_utc": None,
+                **(cursors or {}).get(subreddit_name, {}),
+            }
+        return advanced[subreddit_name]
+
+    for post in posts_dict:
+        cursor = cursor_for(post["subreddit"])
+        if post["created_utc"] > (cursor["last_post_created_utc"] or 0):
+            cursor["last_post_created_utc"] = post["created_utc"]
+            cursor["last_post_fullname"] = f"t3_{post['post_id']}"
+
+    for comment in posts_comments:
+        cursor = cursor_for(comment["subreddit"])
+        if comment["created_utc"] > (cursor["last_comment_created_utc"] or 0):
+            cursor["last_comment_created_utc"] = comment["created_utc"]
+
+    return advanced
+
+
+async def _load_comments(
+    reddit_read_only,
+    post,
+    subreddit_name,
+    timeout,
+    since_utc=None,
+    seen=None,
+):
+    """
+    Fetch the top-level comments of a single post
+
+    The caller holds the comment semaphore, so a tree only frees its slot
+    once it has been handed on.
+
+    Args:
+        reddit_read_only (asyncpraw.Reddit): Shared Reddit session
+        post: Submission from the subreddit listing
+        subreddit_name (str): Name of the subreddit the post belongs to
+        timeout (float): Seconds allowed for this post
+        since_utc (float): Only keep comments created after this timestamp
+        seen: Optional container of already processed ids to leave out
+
+    Returns:
+        list: Comments of the post, empty if the fetch failed or timed out
+    """
+
+    async def fetch():
+        submission = await reddit_read_only.submission(id=post.id)
+        await submission.comments.replace_more(limit=0)
+        return [
+            _comment_item(comment, subreddit_name, post.id, post.title)
+            for comment in submission.comments
+            if (since_utc is None or comment.created_utc > since_utc)
+            and (seen is None or comment.id not in seen)
+        ]
+
+    try:
+        return await asyncio.wait_for(fetch(), timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"Timed out fetching comments for post {post.id} after {timeout}s")
+    except Exception as e:
+        print(f"Error processing comments for post {post.id}: {e}")
+    return []
+
+
+async def _load_comment_listing(
+    subreddit, subreddit_name, limit, since_utc=None, seen=None
+):
+    """
+    Read the newest comments of a subreddit straight from its comment listing
+
+    The listing generator pages through /r/{subreddit}/comments 100 comments
+    per request, so this costs a handful of calls instead of one per post.
+
+    Args:
+        subreddit (asyncpraw.models.Subreddit): Subreddit to read
+        subreddit_name (str): Name of the subreddit
+        limit (int): Maximum number of comments to read
+        since_utc (float): Stop at the first comment not newer than this timestamp
+        seen: Optional container of already processed ids to leave out
+
+    Returns:
+        list: Comments attached to their parent post id
+    """
+    comments = []
+    async for comment in subreddit.comments(limit=limit):
+        # The listing is newest first, everything past the cursor was seen already
+        if since_utc is not None and comment.created_utc <= since_utc:
+            break
+        if seen is not None and comment.id in seen:
+            continue
+        # link_id is the fullname of the parent submission, e.g. "t3_1nak9eg"
+        post_id = comment.link_id.split("_", 1)[-1]
+        comments.append(
+            _comment_item(
+                comment, subreddit_name, post_id, getattr(comment, "link_title", None)
+            )
+        )
+    return comments
+
+
+async def _extract_subreddit(
+    reddit_read_only,
+    subreddit_name,
+    semaphore,
+    comment_semaphore,
+    comment_timeout,
+    comment_mode,
+    cursor,
+    index,
+    total,
+    seen=None,
+    emit=None,
+):
+    """
+    Extract the newest posts and their comments from a single subreddit
+
+    Args:
+        reddit_read_only (asyncpraw.Reddit): Shared Reddit session
+        subreddit_name (str): Name of the subreddit to extract
+        semaphore (asyncio.Semaphore): Limits how many subreddits run at once
+        comment_semaphore (asyncio.Semaphore): Limits comment fetches in flight
+        comment_timeout (float): Seconds allowed per post comment fetch
+        comment_mode (str): "submission" or "listing" comment ingestion
+        cursor (dict): High-water mark of the previous scan, None for a full scan
+        index (int): Position of the subreddit in the requested list
+        total (int): Number of requested subreddits
+        seen: Optional container of already processed ids; matching posts
+            and comments are left out, and seen posts older than
+            REDDIT_SEEN_TREE_HOURS do not have their comment trees read
+        emit: Optional async callback emit(kind, items) receiving every post
+            and every comment tree as soon as it is fetched, instead of
+            collecting them; awaiting it lets a slow consumer pause fetching
+
+    Returns:
+        tuple: (posts, comments) extracted from the subreddit, empty if emit is given
+    """
+    posts_dict = []
+    posts_comments = []
+
+    async def put(kind, items):
+        if emit is not None:
+            await emit(kind, items)
+        elif kind == "post":
+            posts_dict.extend(items)
+        else:
+            posts_comments.extend(items)
+
+    async def load_tree(post):
+        # The slot is held until the tree is handed on, so a waiting consumer
+        # caps the number of fetched trees held in memory
+        async with comment_semaphore:
+            comments = await _load_comments(
+                reddit_read_only,
+                post,
+                subreddit_name,
+                comment_timeout,
+                since_comment_utc,
+                seen,
+            )
+            if emit is not None:
+                await emit("comment", comments)
+                return []
+            return comments
+
+    async with semaphore:
+        print(f"Processing subreddit {index + 1}/{total}: {subreddit_name}")
+
+        try:
+            subreddit = await reddit_read_only.subreddit(subreddit_name)
+            cursor = cursor or {}
+            since_post_utc = cursor.get("last_post_created_utc")
+            since_comment_utc = cursor.get("last_comment_created_utc")
+
+            # Posts whose comment trees are read: every new post, topped up
+            # with older ones to POST_LIMIT, because comments keep arriving on
+            # posts that were already scanned
+            comment_posts = []
+            window = 0
+            limit = (
+                POST_LIMIT
+                if since_post_utc is None
+                else max(POST_LIMIT, INCREMENTAL_POST_LIMIT)
+            )
+            seen_tree_before = time.time() - SEEN_TREE_HOURS * 3600
+            async for post in subreddit.new(limit=limit):
+                is_new = since_post_utc is None or post.created_utc > since_post_utc
+                if not is_new and window >= POST_LIMIT:
+                    break
+                window += 1
+                is_seen = seen is not None and post.id in seen
+                # The tree of an old seen post was read before and is not expanded again
+                if not (is_seen and post.created_utc < seen_tree_before):
+                    comment_posts.append(post)
+                if not is_new or is_seen:
+                    continue
+                await put(
+                    "post",
+                    [
+                        {
+                            "post_id": post.id,
+                            "created_utc": post.created_utc,
+                            "data": {
+                                "title": post.title,
+                                "post_text": textwrap.shorten(
+                                    post.selftext, width=100, placeholder="..."
+                                ),
+                                "url": post.url,
+                            },
+                            "subreddit": subreddit_name,
+                            "source": {
+                                "title": post.title,
+                                "text": post.selftext,
+                                "url": f"{REDDIT_URL}{post.permalink}",
+                                "score": post.score,
+                            },
+                        }
+                    ],
+                )
+
+            if comment_mode == COMMENT_MODE_LISTING:
+                await put(
+                    "comment",
+                    await _load_comment_listing(
+                        subreddit,
+                        subreddit_name,
+                        COMMENT_LISTING_LIMIT,
+                        since_comment_utc,
+                        seen,
+                    ),
+                )
+            else:
+                # Streaming hands each tree on as soon as it arrives; collected
+                # trees are kept in post order so results are stable
+                trees = await asyncio.gather(*(load_tree(post) for post in comment_posts))
+                for comments in trees:
+                    posts_comments.extend(comments)
+
+        except Exception as e:
+            print(f"Error processing subreddit {subreddit_name}: {e}")
+
+    return posts_dict, posts_comments
+
+
+def _open_session():
+    """Create the read-only Reddit session shared by all subreddit fetches"""
+    return asyncpraw.Reddit(
         client_id=os.getenv("REDDIT_CLIENT_ID"),
         client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
         user_agent=os.getenv("REDDIT_USER_AGENT"),
     )
 
+
+def _subreddit_jobs(
+    reddit_read_only,
+    subreddits,
+    max_concurrency,
+    max_comment_concurrency,
+    comment_timeout,
+    comment_modes,
+    cursors,
+    seen=None,
+    emit=None,
+):
+    """Build one _extract_subreddit coroutine per subreddit, sharing the limits"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or MAX_CONCURRENT_SUBREDDITS))
+    comment_semaphore = asyncio.Semaphore(
+        max(1, max_comment_concurrency or MAX_CONCURRENT_COMMENT_FETCHES)
+    )
+    comment_timeout = comment_timeout or COMMENT_FETCH_TIMEOUT
+    comment_modes = comment_modes or {}
+    cursors = cursors or {}
+
+    return [
+        _extract_subreddit(
+            reddit_read_only,
+            subreddit_name,
+            semaphore,
+            comment_semaphore,
+            comment_timeout,
+            comment_modes.get(subreddit_name, DEFAULT_COMMENT_MODE),
+            cursors.get(subreddit_name),
+            i,
+            len(subreddits),
+            seen,
+            emit,
+        )
+        for i, subreddit_name in enumerate(subreddits)
+    ]
+
+
+def _check_comment_modes(comment_modes):
+    for subreddit_name, mode in (comment_modes or {}).items():
+        if mode not in COMMENT_MODES:
+            raise ValueError(f"Unknown comment mode '{mode}' for {subreddit_name}")
+
+
+async def get_reddit_data(
+    subreddits=None,
+    max_concurrency=None,
+    max_comment_concurrency=None,
+    comment_timeout=None,
+    comment_modes=None,
+    cursors=None,
+    seen=None,
+):
+    """
+    Extract posts and comments from several subreddits concurrently
+
+    Args:
+        subreddits (list): List of subreddit names to scan
+        max_concurrency (int): Maximum number of subreddits fetched at once,
+            defaults to REDDIT_MAX_CONCURRENT_SUBREDDITS
+        max_comment_concurrency (int): Maximum number of comment trees fetched
+            at once across all subreddits, defaults to REDDIT_MAX_CONCURRENT_COMMENTS
+        comment_timeout (float): Seconds allowed per post comment fetch,
+            defaults to REDDIT_COMMENT_TIMEOUT
+        comment_modes (dict): Optional subreddit name -> comment mode
+            ("submission" or "listing"), others use REDDIT_COMMENT_MODE
+        cursors (dict): Optional subreddit name -> cursor from a previous scan;
+            only content newer than the cursor is fetched
+        seen: Optional container of already processed post and comment ids,
+            e.g. seen_index.seen_index; those items are not returned, and
+            seen posts older than REDDIT_SEEN_TREE_HOURS do not have their
+            comments fetched
+
+    Returns:
+        tuple: (posts, comments) in the same order as the requested subreddits
+    """
     if subreddits is None:
         subreddits = ["saas"]
+    _check_comment_modes(comment_modes)
+
+    reddit_read_only = _open_session()
+    try:
+        results = await asyncio.gather(
+            *_subreddit_jobs(
+                reddit_read_only,
+                subreddits,
+                max_concurrency,
+                max_comment_concurrency,
+                comment_timeout,
+                comment_modes,
+                cursors,
+                seen,
+            )
+        )
+    finally:
+        await reddit_read_only.close()
 
     posts_dict = []
     posts_comments = []
+    for subreddit_posts, subreddit_comments in results:
+        posts_dict.extend(subreddit_posts)
+        posts_comments.extend(subreddit_comments)
+
+    print(f"Extracted {len(posts_dict)} posts and {len(posts_comments)} comments")
+    return posts_dict, posts_comments
+
+
+async def stream_reddit_data(
+    subreddits=None,
+    batch_size=None,
+    max_concurrency=None,
+    max_comment_concurrency=None,
+    comment_timeout=None,
+    comment_modes=None,
+    cursors=None,
+    seen=None,
+):
+    """
+    Extract posts and comments concurrently and yield them in batches
+
+    Every post and comment tree goes through a bounded queue as soon as it
+    is fetched, so batches are yielded while subreddits are still being
+    read. Fetchers wait once the queue is full, so a caller that stops
+    iterating (e.g. while its classifications are busy) also pauses
+    extraction and memory stays bounded. Batches are not ordered.
+
+    Args:
+        subreddits (list): List of subreddit names to scan
+        batch_size (int): Maximum number of posts plus comments per batch,
+            defaults to REDDIT_BATCH_SIZE
+        max_concurrency, max_comment_concurrency, comment_timeout,
+        comment_modes, cursors, seen: Same as get_reddit_data
+
+    Yields:
+        tuple: (posts, comments) holding at most batch_size items together
+    """
+    if subreddits is None:
+        subreddits = ["saas"]
+    _check_comment_modes(comment_modes)
+    batch_size = max(1, batch_size or BATCH_SIZE)
 
-    for i, subreddit_name in enumerate(subreddits):
-        print(f"Processing subreddit {i + 1}/{len(subreddits)}: {subreddit_name}")
+    # Items are tagged with their kind so one queue keeps arrival order
+    queue = asyncio.Queue(maxsize=QUEUE_BATCHES * batch_size)
+    done = object()
 
+    async def emit(kind, items):
+        for item in items:
+            await queue.put((kind, item))
+
+    async def extract():
         try:
-            subreddit = await reddit_read_only.subreddit(subreddit_name)
-            posts_list = []
-            async for post in subreddit.new(limit=20):
-                posts_list.append(post)
-
-            for post in posts_list:
-                posts_dict.append(
-                    {
-                        "post_id": post.id,
-                        "data": {
-                            "title": post.title,
-                            "post_text": textwrap.shorten(
-                                post.selftext, width=100, placeholder="..."
-                            ),
-                            "url": post.url,
-                        },
-                        "subreddit": subreddit_name,
-                    }
+            await asyncio.gather(
+                *_subreddit_jobs(
+                    reddit_read_only,
+                    subreddits,
+                    max_concurrency,
+                    max_comment_concurrency,
+                    comment_timeout,
+                    comment_modes,
+                    cursors,
+                    seen,
+                    emit,
                 )
+            )
+        except Exception as e:
+            print(f"Error extracting Reddit data: {e}")
+        # Not reached when cancelled, the consumer is gone by then
+        await queue.put(done)
 
-            for post in posts_list:
-                try:
-                    submission = await reddit_read_only.submission(id=post.id)
-                    await submission.comments.replace_more(limit=0)
-                    for comment in submission.comments:
-                        posts_comments.append(
-                            {
-                                "comment_id": comment.id,
-                                "data": {
-                                    "comment_text": textwrap.shorten(
-                                        comment.body, width=200, placeholder="..."
-                                    ),
-                                },
-                                "subreddit": subreddit_name,
-                            }
-                        )
-                except Exception as e:
-                    print(f"Error processing comments for post {post.id}: {e}")
-                    continue
+    reddit_read_only = _open_session()
+    producer = asyncio.create_task(extract())
 
-        except Exception as e:
-            print(f"Error processing subreddit {subreddit_name}: {e}")
-            continue
+    pending = []
+    total_posts = 0
+    total_comments = 0
 
-    await reddit_read_only.close()
+    def take_batch():
+        batch = pending[:batch_size]
+        del pending[:batch_size]
+        return (
+            [item for kind, item in batch if kind == "post"],
+            [item for kind, item in batch if kind == "comment"],
+        )
 
-    print(f"Extracted {len(posts_dict)} posts and {len(posts_comments)} comments")
-    return posts_dict, posts_comments
-#komment 
\ No newline at end of file
+    try:
+        while True:
+            entry = await queue.get()
+            if entry is done:
+                break
+            pending.append(entry)
+            if entry[0] == "post":
+                total_posts += 1
+            else:
+                total_comments += 1
+            if len(pending) >= batch_size:
+                yield take_batch()
+
+        while pending:
+            yield take_batch()
+    finally:
+        # Stop outstanding fetches if the consumer gave up early
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        await reddit_read_only.close()
+
+    print(f"Extracted {total_posts} posts and {total_comments} comments")
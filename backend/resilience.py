@@ -0,0 +1,130 @@
+import asyncio
+import os
+import random
+from collections import defaultdict, deque
+import httpx
+from dotenv import load_dotenv
+from google.genai import errors
+
+load_dotenv()
+
+# Seconds a single AI call may take before it is abandoned
+CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "120"))
+# Attempts per call, the first one included
+MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+# Exponential backoff: BASE_DELAY * 2**attempt seconds, capped at MAX_DELAY, full jitter
+BASE_DELAY = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+MAX_DELAY = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Set to "1" to issue a duplicate request when a call is slower than usual
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0") == "1"
+# Fixed hedge delay in seconds; without it the observed p95 latency is used
+HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0")) or None
+# Latencies observed before the p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LatencyTracker:
+    """Rolling window of call latencies per model, used to pick hedge delays"""
+
+    def __init__(self, window: int = 200):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def percentile(self, name: str, q: float):
+        samples = self.samples[name]
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+latency_tracker = LatencyTracker()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, rate limits, server errors and dropped connections are retried"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return False
+
+
+async def _timed(make_attempt, name: str, deadline: float):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await asyncio.wait_for(make_attempt(), timeout=deadline)
+    latency_tracker.record(name, loop.time() - started)
+    return result
+
+
+async def _hedged(make_attempt, name: str, deadline: float, hedge_delay):
+    """
+    Run an attempt and, if it is still running after hedge_delay, race a
+    duplicate against it. The first successful response wins and the other
+    request is cancelled.
+    """
+    primary = asyncio.create_task(_timed(make_attempt, name, deadline))
+    if hedge_delay is None:
+        return await primary
+
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        print(f"{name} slower than {hedge_delay:.1f}s, sending hedged request")
+        pending.add(asyncio.create_task(_timed(make_attempt, name, deadline)))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_resilience(make_attempt, name: str, deadline: float = None):
+    """
+    Run an AI call with a deadline, retries with jittered exponential
+    backoff and optional hedging
+
+    Args:
+        make_attempt: Zero-argument function returning a fresh coroutine for
+            one attempt; it is called again for every retry and hedge
+        name (str): Name used for latency tracking and logs, e.g. the model
+        deadline (float): Seconds per attempt, defaults to LLM_CALL_TIMEOUT
+
+    Returns:
+        The result of the first successful attempt
+
+    Raises:
+        Exception: The last error once it is not retryable or attempts ran out
+    """
+    deadline = deadline or CALL_TIMEOUT
+    for attempt in range(MAX_ATTEMPTS):
+        hedge_delay = None
+        if HEDGE_ENABLED:
+            hedge_delay = HEDGE_DELAY or latency_tracker.percentile(name, 0.95)
+        try:
+            return await _hedged(make_attempt, name, deadline, hedge_delay)
+        except Exception as e:
+            if attempt + 1 >= MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2**attempt))
+            print(
+                f"{name} attempt {attempt + 1} failed ({type(e).__name__}: {e}), "
+                f"retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
@@ -1,12 +1,43 @@
 import asyncio
+import json
+import os
 import schedule
 import time
+from dotenv import load_dotenv
 from controller import LeadlyController
+from db import init_db, close_db
+from leadFinderAi import close_client
+
+load_dotenv()
 
 # User query for lead finding
 USER_QUERY = "I am a freelance graphic designer and a full stack web developer looking for potential clients who need design or/and development services."
 
 
+def load_profiles():
+    """
+    Load the service profiles to classify for on every scheduled run
+
+    LEADLY_PROFILES may hold a JSON object of profile name -> service
+    description, or the path of a JSON file with that object. Without it
+    the single USER_QUERY is used.
+
+    Returns:
+        dict: Profile name -> service description, empty for USER_QUERY only
+    """
+    raw = os.getenv("LEADLY_PROFILES", "").strip()
+    if not raw:
+        return {}
+    try:
+        if raw.startswith("{"):
+            return json.loads(raw)
+        with open(raw) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error loading LEADLY_PROFILES, using USER_QUERY: {e}")
+        return {}
+
+
 async def run_scheduled_job():
     """
     Run the scheduled lead finder job
@@ -14,7 +45,7 @@ async def run_scheduled_job():
     controller = LeadlyController()
     print("Running scheduled lead finder...")
     try:
-        new_leads = await controller.scheduled_run(USER_QUERY)
+        new_leads = await controller.scheduled_run(USER_QUERY, profiles=load_profiles())
         print(f"Found {len(new_leads)} new leads:")
         for url, description in new_leads.items():
             print(f"  {url}: {description}")
@@ -30,7 +61,14 @@ def run_scheduler():
     """
 
     async def job():
-        await run_scheduled_job()
+        # Every run gets its own event loop, so the pool and the Gemini
+        # client are closed with it
+        await init_db()
+        try:
+            await run_scheduled_job()
+        finally:
+            await close_client()
+            await close_db()
 
     # Schedule the job every 6 hours
     schedule.every(6).hours.do(lambda: asyncio.run(job()))
@@ -40,7 +78,7 @@ def run_scheduler():
 
     # Run the first job immediately
     print("Running initial lead finder...")
-    asyncio.run(run_scheduled_job())
+    asyncio.run(job())
 
     # Keep the scheduler running
     while True:
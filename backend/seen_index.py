@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import math
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+from db import count_seen_items, iter_seen_items
+
+load_dotenv()
+
+# Set to "0" to extract and classify items that were processed before
+SEEN_INDEX_ENABLED = os.getenv("SEEN_INDEX_ENABLED", "1") == "1"
+# Bloom filter file, loaded at startup and written after every run
+SEEN_INDEX_PATH = os.getenv("SEEN_INDEX_PATH", "seen_index.npz")
+# Number of ids the filter is sized for before its false-positive rate degrades
+SEEN_INDEX_CAPACITY = int(os.getenv("SEEN_INDEX_CAPACITY", "10000000"))
+# Target probability that a new item is wrongly reported as seen and skipped
+SEEN_INDEX_FP_RATE = float(os.getenv("SEEN_INDEX_FP_RATE", "0.001"))
+# Hours after which the filter is rebuilt from the database
+SEEN_INDEX_REBUILD_HOURS = float(os.getenv("SEEN_INDEX_REBUILD_HOURS", "24"))
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, backed by a numpy bit array
+
+    Membership tests never miss an added key and report a key that was
+    never added with probability fp_rate while fewer than capacity keys
+    are stored. 10 million ids at 0.1% take about 18 MB.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    @classmethod
+    def from_arrays(cls, bits, size: int, hashes: int, count: int):
+        """Restore a filter from its stored bit array and parameters"""
+        bloom = cls.__new__(cls)
+        bloom.bits, bloom.size, bloom.hashes, bloom.count = bits, size, hashes, count
+        return bloom
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little") % self.size
+        h2 = (int.from_bytes(digest[8:], "little") | 1) % self.size
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def _positions_many(self, keys: list) -> np.ndarray:
+        """Vectorized _positions, one row of bit positions per key"""
+        digests = b"".join(
+            hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest() for key in keys
+        )
+        halves = np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+        size = np.uint64(self.size)
+        h1 = halves[:, 0] % size
+        h2 = (halves[:, 1] | np.uint64(1)) % size
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return (h1[:, None] + steps * h2[:, None]) % size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def add_many(self, keys) -> bool:
+        """Add the keys not in the filter yet, return True if any was added"""
+        keys = list(keys)
+        if not keys:
+            return False
+        positions = self._positions_many(keys)
+        offsets = (positions >> np.uint64(3)).astype(np.intp)
+        masks = np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)
+        new = ~(self.bits[offsets] & masks).astype(bool).all(axis=1)
+        if not new.any():
+            return False
+        np.bitwise_or.at(self.bits, offsets[new].ravel(), masks[new].ravel())
+        self.count += int(new.sum())
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class SeenIndex:
+    """Bloom filter of processed post and comment ids, persisted as .npz"""
+
+    def __init__(self, path: str, capacity: int, fp_rate: float):
+        self.path = path
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.filter = BloomFilter(capacity, fp_rate)
+        # Without a stored filter the first run builds one from the database
+        self.built_at = 0
+        self.loaded = False
+        self.dirty = False
+
+    def load(self):
+        """Load the filter from disk, keeping an empty one if there is none"""
+        self.loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                size, hashes, count, built_at = data["meta"].tolist()
+                fp_rate = float(data["fp_rate"])
+                if fp_rate != self.fp_rate:
+                    # Tuned since the file was written, rebuild at the next run
+                    built_at = 0
+                self.filter = BloomFilter.from_arrays(data["bits"], size, hashes, count)
+            self.built_at = built_at
+            # A rebuilt filter may be larger than SEEN_INDEX_CAPACITY
+            self.capacity = max(
+                self.capacity, int(size * math.log(2) ** 2 / -math.log(self.fp_rate))
+            )
+            print(f"Loaded seen index with about {count} ids")
+        except Exception as e:
+            print(f"Error loading seen index {self.path}: {e}")
+
+    def __contains__(self, key: str) -> bool:
+        if not self.loaded:
+            self.load()
+        return key in self.filter
+
+    def add_many(self, keys):
+        """Mark ids as processed"""
+        if not self.loaded:
+            self.load()
+        if self.filter.add_many(keys):
+            self.dirty = True
+
+    def needs_rebuild(self) -> bool:
+        """True once the filter is older than SEEN_INDEX_REBUILD_HOURS or overfull"""
+        if not self.loaded:
+            self.load()
+        age_hours = (time.time() - self.built_at) / 3600
+        return age_hours >= SEEN_INDEX_REBUILD_HOURS or self.filter.count > self.capacity
+
+    def replace(self, bloom: BloomFilter):
+        """Swap in a freshly built filter"""
+        self.filter = bloom
+        self.built_at = time.time()
+        self.loaded = True
+        self.dirty = True
+
+    def flush(self):
+        """Write the filter to disk if ids were added"""
+        if not self.dirty or not self.path:
+            return
+        try:
+            # Write next to the target and rename, so readers never see half a file
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                bits=self.filter.bits,
+                meta=np.array(
+                    [
+                        self.filter.size,
+                        self.filter.hashes,
+                        self.filter.count,
+                        self.built_at,
+                    ],
+                    dtype=np.int64,
+                ),
+                fp_rate=np.array(self.fp_rate),
+            )
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            print(f"Error saving seen index {self.path}: {e}")
+
+
+# Process-wide seen index
+seen_index = SeenIndex(SEEN_INDEX_PATH, SEEN_INDEX_CAPACITY, SEEN_INDEX_FP_RATE)
+
+
+async def rebuild_seen_index():
+    """
+    Rebuild the seen index from the seen_items table
+
+    Only ids recorded by scheduled runs are loaded, so items classified for
+    other descriptions by manual searches are never skipped. Rebuilding drops
+    ids purged from the table and resizes the filter to the current number
+    of ids.
+    """
+    # Size for twice the current ids so the new filter has room to grow
+    count = await count_seen_items()
+    seen_index.capacity = max(SEEN_INDEX_CAPACITY, 2 * count)
+    bloom = BloomFilter(seen_index.capacity, seen_index.fp_rate)
+    chunk = []
+    async for key in iter_seen_items():
+        chunk.append(key)
+        if len(chunk) >= 10000:
+            # Hashing is CPU-bound, keep it off the event loop
+            await asyncio.to_thread(bloom.add_many, chunk)
+            chunk = []
+    await asyncio.to_thread(bloom.add_many, chunk)
+    seen_index.replace(bloom)
+    print(f"Rebuilt seen index from {bloom.count} ids")
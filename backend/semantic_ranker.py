@@ -0,0 +1,122 @@
+import os
+import zlib
+import numpy as np
+from dotenv import load_dotenv
+from prefilter import tokenize, item_text
+from reddit_data_extractor import item_kind
+
+load_dotenv()
+
+# Set to "1" to drop items unlike the query before the AI. Off by default: the
+# hashed embeddings only match shared words, and the threshold is not calibrated
+SEMANTIC_RANK_ENABLED = os.getenv("SEMANTIC_RANK_ENABLED", "0") == "1"
+# Items less similar to user_query than this never reach the AI
+SEMANTIC_MIN_SIMILARITY = float(os.getenv("SEMANTIC_MIN_SIMILARITY", "0.05"))
+# Keep at most this many items per batch, 0 keeps every item above the threshold
+SEMANTIC_TOP_K = int(os.getenv("SEMANTIC_TOP_K", "0"))
+# Dimension of the hashed feature space
+EMBEDDING_DIM = 2**12
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Embed text with a signed hashing vectorizer over words and word bigrams
+
+    No model or network access is needed, the same text always gives the
+    same vector, and similar wording lands on the same buckets.
+
+    Args:
+        text (str): Text to embed
+
+    Returns:
+        np.ndarray: L2-normalized float32 vector of EMBEDDING_DIM
+    """
+    tokens = tokenize(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    if not features:
+        return vector
+
+    hashes = np.array(
+        [zlib.crc32(feature.encode("utf-8")) for feature in features], dtype=np.uint32
+    )
+    buckets = (hashes % EMBEDDING_DIM).astype(np.intp)
+    # The top bit picks the sign so colliding features tend to cancel out
+    signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, buckets, signs)
+
+    # Sublinear term frequency, then unit length for cosine similarity
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_many(texts: list) -> np.ndarray:
+    """
+    Embed a batch of texts
+
+    Embedding is a few hashes per token, cheaper than storing and reloading
+    the vectors, so nothing is cached between runs.
+
+    Args:
+        texts (list): Texts to embed
+
+    Returns:
+        np.ndarray: len(texts) x EMBEDDING_DIM matrix
+    """
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.vstack([embed(text) for text in texts])
+
+
+def rank_items(
+    user_query: str,
+    posts_dict: list,
+    posts_comments: list,
+    top_k: int = None,
+    min_similarity: float = None,
+):
+    """
+    Keep only the items most similar to the user's service description
+
+    Similarity is the cosine between hashed embeddings, computed for the
+    whole batch in one matrix-vector product.
+
+    Args:
+        user_query (str): The user's service description
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+        top_k (int): Maximum number of items kept, defaults to SEMANTIC_TOP_K
+        min_similarity (float): Threshold, defaults to SEMANTIC_MIN_SIMILARITY
+
+    Returns:
+        tuple: (posts, comments) that should be classified by the AI
+    """
+    if not SEMANTIC_RANK_ENABLED:
+        return posts_dict, posts_comments
+
+    items = posts_dict + posts_comments
+    if not items:
+        return posts_dict, posts_comments
+
+    top_k = SEMANTIC_TOP_K if top_k is None else top_k
+    min_similarity = SEMANTIC_MIN_SIMILARITY if min_similarity is None else min_similarity
+
+    similarities = embed_many([item_text(item) for item in items]) @ embed(user_query)
+    order = np.argsort(-similarities, kind="stable")
+    order = order[similarities[order] >= min_similarity]
+    if top_k > 0:
+        order = order[:top_k]
+    keep = set(order.tolist())
+
+    kept_posts = [
+        item for i, item in enumerate(items) if i in keep and item_kind(item) == "post"
+    ]
+    kept_comments = [
+        item for i, item in enumerate(items) if i in keep and item_kind(item) == "comment"
+    ]
+    print(
+        f"Semantic ranking kept {len(kept_posts)}/{len(posts_dict)} posts and "
+        f"{len(kept_comments)}/{len(posts_comments)} comments"
+    )
+    return kept_posts, kept_comments
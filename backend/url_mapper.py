@@ -1,15 +1,16 @@
 import json
 import re
+from reddit_data_extractor import item_id, item_source
 
-def process_ai_output(ai_output):
+def parse_ai_output(ai_output):
     """
-    Takes the output of the AI as input and creates a mapping of URLs to descriptions.
-    
+    Parses the raw output of the AI into the post_leads/comment_leads dictionary.
+
     Args:
         ai_output: The raw output from the AI (could be JSON string or dict, or plain text)
-        
+
     Returns:
-        dict: A dictionary with URLs as keys and AI descriptions as values
+        dict: The parsed AI output, or an empty dict if no leads were returned
     """
     # Handle case where AI returns plain text (no leads found)
     if isinstance(ai_output, str):
@@ -42,6 +43,117 @@ def process_ai_output(ai_output):
     if not isinstance(ai_data, dict):
         print("AI output is not a valid dictionary")
         return {}
+
+    return ai_data
+
+class LeadStreamParser:
+    """
+    Incremental parser for streamed post_leads/comment_leads JSON.
+
+    Feed it the response text piece by piece as the model streams it; every
+    lead object is returned as soon as its closing brace arrives, long before
+    the whole response exists.
+    """
+
+    LEAD_KEYS = ("post_leads", "comment_leads")
+
+    def __init__(self):
+        self.buffer = ""
+        # Next character of the buffer to scan and {}/[] nesting around it
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        # Last complete string at depth 1 (a key) and the array being read
+        self.last_string = None
+        self.array_key = None
+        self.object_start = None
+        # Whether the root object was seen at all
+        self.started = False
+        self.result = {key: [] for key in self.LEAD_KEYS}
+
+    def feed(self, text):
+        """
+        Consume the next piece of streamed text.
+
+        Args:
+            text (str): Newly received response text
+
+        Returns:
+            list: (key, lead) tuples completed by this piece, key being
+            "post_leads" or "comment_leads"
+        """
+        self.buffer += text
+        completed = []
+
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = self.buffer[self.string_start + 1:self.pos]
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif char in "{[":
+                if self.depth == 0 and char == "{":
+                    self.started = True
+                elif self.depth == 1 and char == "[":
+                    self.array_key = self.last_string
+                elif self.depth == 2 and char == "{":
+                    self.object_start = self.pos
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 2 and char == "}" and self.object_start is not None:
+                    lead = self._complete(self.buffer[self.object_start:self.pos + 1])
+                    if lead is not None:
+                        completed.append((self.array_key, lead))
+                    self.object_start = None
+                elif self.depth == 1:
+                    self.array_key = None
+            self.pos += 1
+
+        # Drop scanned text that no open object or string still refers to
+        if self.object_start is None and not self.in_string:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+        return completed
+
+    def _complete(self, raw):
+        if self.array_key not in self.LEAD_KEYS:
+            return None
+        try:
+            lead = json.loads(raw)
+        except json.JSONDecodeError:
+            print("Error parsing streamed lead:", raw)
+            return None
+        if not isinstance(lead, dict) or 'id' not in lead:
+            return None
+        self.result[self.array_key].append(lead)
+        return lead
+
+def process_ai_output(ai_output):
+    """
+    Takes the output of the AI as input and creates a mapping of URLs to descriptions.
+    
+    Args:
+        ai_output: The raw output from the AI (could be JSON string or dict, or plain text)
+        
+    Returns:
+        dict: A dictionary with URLs as keys and AI descriptions as values
+    """
+    ai_data = parse_ai_output(ai_output)
+    if not ai_data:
+        return {}
     
     url_description_map = {}
     
@@ -65,6 +177,66 @@ def process_ai_output(ai_output):
     
     return url_description_map
 
+def build_source_index(posts_dict, posts_comments):
+    """
+    Index the full metadata of extracted items by their Reddit id
+
+    Args:
+        posts_dict (list): List of post data from Reddit
+        posts_comments (list): List of comment data from Reddit
+
+    Returns:
+        dict: Reddit id -> item_source dict
+    """
+    return {item_id(item): item_source(item) for item in posts_dict + posts_comments}
+
+
+def _lead_id(url):
+    return url.split("/")[-1] if "/" in url else url
+
+
+def drop_unknown_leads(url_description_map, sources, log=True):
+    """
+    Drop leads whose id is not one of the extracted items
+
+    The source index covers everything sent to the AI, so a missing id was
+    made up or garbled by the model.
+
+    Args:
+        url_description_map (dict): URLs as keys and AI descriptions as values
+        sources (dict): Reddit id -> item_source dict, see build_source_index
+        log (bool): Print the dropped ids
+
+    Returns:
+        dict: The mapping without unknown leads
+    """
+    known = {}
+    for url, description in url_description_map.items():
+        if _lead_id(url) in sources:
+            known[url] = description
+        elif log:
+            print(f"Dropping lead with unknown id {_lead_id(url)}")
+    return known
+
+
+def join_sources(url_description_map, sources):
+    """
+    Attach the extracted metadata to each lead of a URL-description mapping
+
+    Args:
+        url_description_map (dict): URLs as keys and AI descriptions as values
+        sources (dict): Reddit id -> item_source dict, see build_source_index
+
+    Returns:
+        list: One dict per lead with the item_source keys and a description;
+        leads missing from the index are dropped
+    """
+    return [
+        {**sources[_lead_id(url)], "description": description}
+        for url, description in drop_unknown_leads(url_description_map, sources).items()
+    ]
+
+
 # For testing purposes
 if __name__ == "__main__":
     # Test case 1: Normal JSON output
@@ -242,9 +242,9 @@ function App() {
             ) : leads.length > 0 ? (
               <div className="leads-grid">
                 {leads.map((lead) => (
-                  <div key={lead.id} className="lead-card">
-                    <h3 className="lead-title">{lead.title}</h3>
-                    <p className="lead-description">{lead.post_text}</p>
+                  <div key={`${lead.source}-${lead.id}`} className="lead-card">
+                    <h3 className="lead-title">{lead.title ?? 'Comment'}</h3>
+                    <p className="lead-description">{lead.description ?? lead.post_text}</p>
                     <div className="lead-footer">
                       <span className="lead-subreddit">r/{lead.subreddit_name}</span>
                       <a 
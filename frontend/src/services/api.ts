@@ -28,11 +28,15 @@ api.interceptors.response.use(
 
 export interface Lead {
   id: number;
+  source: 'post' | 'comment';
   post_id: string;
-  title: string;
+  comment_id: string | null;
+  title: string | null;
   post_text: string | null;
   url: string;
-  subreddit_name: string;
+  subreddit_name: string | null;
+  description: string | null;
+  score: number | null;
   created_at: string;
   updated_at: string;
 }